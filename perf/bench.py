@@ -0,0 +1,380 @@
+"""
+Benchmarks for the logging paths: subjects, observers, formats,
+remote and async sending, and timers.
+
+For each benchmark, reports throughput (ops/sec), latency percentiles of
+single operations, and memory use: the net number of allocated blocks
+per operation (non-zero if events are retained) and the peak traced
+memory. Results can be saved as JSON, and compared with a saved baseline;
+the exit status is 1 if any benchmark regressed.
+
+    python perf/bench.py --json base.json          # save baseline
+    python perf/bench.py --baseline base.json      # compare
+    python perf/bench.py -k 'stream.*' -k remote   # some benchmarks
+"""
+__author__ = "agent <agent@local>"
+__created__ = "2026-10-16"
+
+import argparse
+import array
+import fnmatch
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import semilog
+from semilog import Server, Remote, filters, timer
+from semilog.send import Subject, Stream, Observer, RingBuffer, Lazy, \
+    Channel
+
+_clock = time.perf_counter
+
+#: Values of the benchmark event
+VALUES = {'i': 1, 'msg': 'hello, world', 'x': 2.5}
+TEXT_FMT = Subject.default_fmt
+PORT = 9010  # and up, one per remote benchmark
+
+#: (name, setup function) for each benchmark, in order
+BENCHMARKS = []
+
+def benchmark(name):
+    """Register setup function for a benchmark. The function returns
+    `(op, cleanup)`, where `op` does one operation, and `cleanup` is
+    None or a function to call after the benchmark.
+    """
+    def register(fn):
+        BENCHMARKS.append((name, fn))
+        return fn
+    return register
+
+
+class Null(Observer):
+    def event(self, mapping):
+        pass
+
+def _subject(*observers, **kwargs):
+    return Subject({'observers': list(observers)}, **kwargs)
+
+def _log_op(subject):
+    info = subject.info
+    return lambda: info('bench', **VALUES)
+
+def _closing(*objs):
+    def cleanup():
+        for obj in objs:
+            obj.close()
+    return cleanup
+
+# Dispatch
+
+for _n in (0, 1, 4, 16):
+    def _setup(n=_n):
+        return _log_op(_subject(*[Null(severity='D') for i in range(n)])), \
+            None
+    benchmark('subject.observers_{:d}'.format(_n))(_setup)
+
+@benchmark('subject.filtered_out')
+def _filtered_out():
+    s = _subject(Null(severity='W'))
+    debug = s.debug
+    return lambda: debug('bench', **VALUES), None
+
+@benchmark('subject.accept_override')
+def _accept_override():
+    class Accepting(Null):
+        def accept(self, mapping):
+            return True
+    return _log_op(_subject(Accepting())), None
+
+@benchmark('subject.filters')
+def _filters():
+    return _log_op(_subject(Null(filters=[
+        filters.EveryKth(first=1, every=10)]))), None
+
+@benchmark('subject.lazy')
+def _lazy():
+    s = _subject(Null())
+    info, value = s.info, Lazy(lambda: 42)
+    return lambda: info('bench', v=value, **VALUES), None
+
+@benchmark('channel')
+def _channel():
+    chan = Channel([Null()])
+    return _log_op(_subject(chan)), _closing(chan)
+
+@benchmark('subject.async')
+def _async():
+    s = _subject(Null(), async=True, overflow='block', max_stored=10000)
+    return _log_op(s), lambda: s.drain(60)
+
+# Formats
+
+@benchmark('stream.text')
+def _stream_text():
+    obs = Stream(TEXT_FMT, stream=open(os.devnull, 'w'))
+    return _log_op(_subject(obs)), _closing(obs, obs.stream)
+
+@benchmark('stream.json')
+def _stream_json():
+    obs = Stream(stream=open(os.devnull, 'w'))
+    return _log_op(_subject(obs)), _closing(obs, obs.stream)
+
+@benchmark('stream.json_buffered')
+def _stream_json_buffered():
+    obs = Stream(stream=open(os.devnull, 'wb'), flush_events=100)
+    return _log_op(_subject(obs)), _closing(obs, obs.stream)
+
+@benchmark('stream.pickle')
+def _stream_pickle():
+    class PickleStream(Stream):
+        json_format = False
+    obs = PickleStream(stream=open(os.devnull, 'wb'))
+    return _log_op(_subject(obs)), _closing(obs, obs.stream)
+
+@benchmark('ring_buffer')
+def _ring_buffer():
+    return _log_op(_subject(RingBuffer(size=10000))), None
+
+@benchmark('binlog')
+def _binlog():
+    from semilog import binlog
+    tmpdir = tempfile.mkdtemp()
+    obs = binlog.BinaryLog(os.path.join(tmpdir, 'bench'))
+    def cleanup():
+        obs.close()
+        shutil.rmtree(tmpdir)
+    return _log_op(_subject(obs)), cleanup
+
+# Remote
+
+def _remote(port, **kwargs):
+    received = [0]
+    def count(record):
+        received[0] += 1
+    server = Server(count, '127.0.0.1', port=port)
+    server.start()
+    remote = Remote('127.0.0.1', port=port, **kwargs)
+    info = _subject(remote).info
+    sent = [0]
+    def op():
+        info('bench', **VALUES)
+        sent[0] += 1
+    def cleanup():
+        remote.close()
+        t0 = time.time()
+        while received[0] < sent[0] and time.time() - t0 < 10:
+            time.sleep(0.05)
+        server.stop()
+    return op, cleanup
+
+@benchmark('remote')
+def _remote_plain():
+    return _remote(PORT)
+
+@benchmark('remote.batch')
+def _remote_batch():
+    return _remote(PORT + 1, batch_events=100)
+
+@benchmark('remote.batch_zlib')
+def _remote_batch_zlib():
+    return _remote(PORT + 3, batch_events=100, compress='zlib')
+
+@benchmark('remote.store')
+def _remote_store():
+    tmpdir = tempfile.mkdtemp()
+    op, cleanup = _remote(PORT + 2, store_path=os.path.join(tmpdir, 'fwd'))
+    def cleanup_store():
+        cleanup()
+        shutil.rmtree(tmpdir)
+    return op, cleanup_store
+
+# Timers
+
+def _noop():
+    pass
+
+@benchmark('timer.none')
+def _timer_none():
+    return _noop, None
+
+@benchmark('timer.time_fn')
+def _timer_time_fn():
+    return timer.time_fn(_noop, log=_subject(Null()).info), None
+
+@benchmark('timer.time_fn_aggregate')
+def _timer_aggregate():
+    return timer.time_fn(_noop, log=_subject(Null()).info,
+                         aggregate=True), None
+
+@benchmark('timer.span')
+def _timer_span():
+    return timer.span('bench', log=_subject(Null()).info)(_noop), None
+
+@benchmark('timer.span_unsampled')
+def _timer_span_unsampled():
+    return timer.span('bench', log=_subject(Null()).info,
+                      sample=0)(_noop), None
+
+
+def _percentile(values, p):
+    return values[min(int(len(values) * p / 100.), len(values) - 1)]
+
+def _overhead(samples):
+    """Time taken by the latency loop itself, per sample."""
+    lat = array.array('d')
+    for i in range(samples):
+        t0 = _clock()
+        _noop()
+        lat.append(_clock() - t0)
+    return min(lat)
+
+def measure(op, number, repeat, samples, overhead):
+    """Measure one operation.
+
+    Args:
+        op (function): Operation
+        number (int): Operations per throughput timing
+        repeat (int): Number of throughput timings; the best is used
+        samples (int): Number of single operations timed for latency
+        overhead (float): Time to subtract from each single operation
+    Returns:
+        (dict) Results
+    """
+    for i in range(min(number, 1000)):  # warm up
+        op()
+    best = None
+    for r in range(repeat):
+        t0 = _clock()
+        for i in range(number):
+            op()
+        dt = _clock() - t0
+        best = dt if best is None else min(best, dt)
+    lat = array.array('d')
+    for i in range(samples):
+        t0 = _clock()
+        op()
+        lat.append(_clock() - t0)
+    lat = sorted(max(t - overhead, 0.) for t in lat)
+    # memory
+    n_mem = min(number, 10000)
+    gc.collect()
+    blocks0 = sys.getallocatedblocks()
+    tracemalloc.start()
+    for i in range(n_mem):
+        op()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks0
+    usec = 1e6
+    return {'ops_per_sec': number / best,
+            'p50_us': _percentile(lat, 50) * usec,
+            'p90_us': _percentile(lat, 90) * usec,
+            'p99_us': _percentile(lat, 99) * usec,
+            'max_us': lat[-1] * usec,
+            'blocks_per_op': float(blocks) / n_mem,
+            'peak_kb': peak / 1024.}
+
+def run(names, number, repeat, samples, out=sys.stdout):
+    """Run benchmarks.
+
+    Returns:
+        (dict) Results, by benchmark name
+    """
+    overhead = _overhead(samples)
+    results = {}
+    for name, setup in BENCHMARKS:
+        if name not in names:
+            continue
+        op, cleanup = setup()
+        try:
+            results[name] = r = measure(op, number, repeat, samples, overhead)
+        finally:
+            if cleanup is not None:
+                cleanup()
+        out.write('{:28s} {:>12,.0f} ops/s  p50 {:7.2f}us  p99 {:7.2f}us  '
+                  '{:6.2f} blocks/op\n'.format(
+                      name, r['ops_per_sec'], r['p50_us'], r['p99_us'],
+                      r['blocks_per_op']))
+        out.flush()
+    return results
+
+def compare(results, baseline, tolerance, out=sys.stdout):
+    """Compare results with baseline results.
+
+    A benchmark regressed if its throughput is lower, or its median
+    latency is higher, by more than `tolerance` (a fraction).
+
+    Returns:
+        (list) Names of benchmarks that regressed
+    """
+    regressed = []
+    out.write('\n{:28s} {:>10s} {:>10s}\n'.format('', 'ops/s', 'p50'))
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        r, b = results[name], baseline[name]
+        ops = r['ops_per_sec'] / b['ops_per_sec'] - 1
+        p50 = r['p50_us'] / b['p50_us'] - 1 if b['p50_us'] else 0.
+        bad = ops < -tolerance or p50 > tolerance
+        if bad:
+            regressed.append(name)
+        out.write('{:28s} {:>+9.1f}% {:>+9.1f}% {}\n'.format(
+            name, ops * 100, p50 * 100, 'REGRESSION' if bad else ''))
+    return regressed
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('-k', dest='patterns', action='append', metavar='PATTERN',
+                   help='Run benchmarks whose names match (repeatable)')
+    p.add_argument('--list', action='store_true', help='List benchmarks')
+    p.add_argument('-n', '--number', type=int, default=20000,
+                   help='Operations per timing (default: %(default)s)')
+    p.add_argument('-r', '--repeat', type=int, default=5,
+                   help='Timings, of which the best is used '
+                        '(default: %(default)s)')
+    p.add_argument('-s', '--samples', type=int, default=20000,
+                   help='Operations timed one by one, for latency '
+                        '(default: %(default)s)')
+    p.add_argument('--json', metavar='FILE',
+                   help='Write results to FILE, e.g. to use as a baseline')
+    p.add_argument('--baseline', metavar='FILE',
+                   help='Compare with results from FILE')
+    p.add_argument('--tolerance', type=float, default=10,
+                   help='Percent change allowed vs. baseline '
+                        '(default: %(default)s)')
+    args = p.parse_args()
+    names = [name for name, _ in BENCHMARKS]
+    if args.patterns:
+        names = [n for n in names if any(
+            [fnmatch.fnmatch(n, pat) or pat in n for pat in args.patterns])]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+    results = run(names, args.number, args.repeat, args.samples)
+    if args.json:
+        meta = {'time': time.time(), 'python': platform.python_version(),
+                'platform': platform.platform(),
+                'semilog': semilog.__version__,
+                'number': args.number, 'repeat': args.repeat,
+                'samples': args.samples}
+        with open(args.json, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2,
+                      sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressed = compare(results, baseline, args.tolerance / 100.)
+        if regressed:
+            print('\nRegressed: {}'.format(', '.join(regressed)))
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -31,10 +31,11 @@ def count(data):
     global n_received
     n_received += 1
 
-def send_messages(n_senders, n_messages):
+def send_messages(n_senders, n_messages, batch=None):
     server = Server(count, '127.0.0.1')
     server.start()
-    config = {'observers': [Remote(host='127.0.0.1', severity='D')]}
+    remote = Remote(host='127.0.0.1', severity='D', batch_events=batch)
+    config = {'observers': [remote]}
     log = semilog.Subject(config=config)
     threads = [SyncSender(log, n_messages) for i in range(n_senders)]
     t0 = time.time()
@@ -42,6 +43,7 @@ def send_messages(n_senders, n_messages):
         thread.start()
     for thread in threads:
         thread.join()
+    remote.flush()
     if n_received == n_senders * n_messages:
         t1 = time.time()
         server.stop()
@@ -57,14 +59,18 @@ def main():
     p = argparse.ArgumentParser()
     p.add_argument("num_senders", type=int)
     p.add_argument("num_messages", type=int)
+    p.add_argument("--batch", type=int, default=None, metavar='N',
+                   help="Send events in batches of N (default: no batching)")
     args = p.parse_args()
     assert args.num_senders > 0
     assert args.num_messages > 0
     s, m = args.num_senders, args.num_messages
     print("Sending {:d} messages from each of {:d} threads".format(m, s))
+    if args.batch:
+        print("Sending in batches of {:d}".format(args.batch))
     print("Receiving the messages at localhost")
     print("...")
-    sec = send_messages(s, m)
+    sec = send_messages(s, m, batch=args.batch)
     print("Sent {:d} messages in {:f} seconds".format(s * m, sec))
     print()
     rate = int(1. * m / sec)
@@ -1,9 +1,11 @@
-__all__ = ['send', 'receive']
+# not 'aio', which needs asyncio
+__all__ = ['send', 'receive', 'serialize', 'binlog', 'read', 'filters',
+           'store', 'codec']
 
 __author__ = "Dan Gunter <dkgunter@lbl.gov>"
 __created__ = "2014-11-26"
 __version__ = '0.0.1'
 
 from .const import Keys
-from .send import Subject, NullSubject, Stream, Remote
+from .send import Subject, NullSubject, Stream, Remote, Lazy
 from .receive import Server
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Send and receive logs with asyncio.
+
+These are counterparts of `send.Remote` and `receive.Server` that run on
+an asyncio event loop, using `zmq.asyncio`. Both are async context managers:
+
+    remote = AsyncRemote(host)
+    async with AsyncServer(handle_record, host), remote:
+        log = Subject({'observers': [remote]})
+        log.info('hello')
+
+Requires Python 3.5 or later.
+"""
+__author__ = "agent <agent@local>"
+__created__ = "2026-10-16"
+
+import asyncio
+from six.moves import cPickle as pickle
+import threading
+import zmq
+import zmq.asyncio
+from . import const, serialize, shared
+from .codec import Compressor, Decompressor
+from .receive import record_decoder, _log
+from .send import Observer, TextFormatter
+
+
+def async_context():
+    """asyncio version of the shared ZeroMQ context, `shared.zmq_context()`.
+    """
+    return zmq.asyncio.Context.shadow(shared.zmq_context().underlying)
+
+
+class AsyncServer(object):
+    """Receive records sent by `send.Remote` or `AsyncRemote` observers,
+    on the event loop.
+
+    The callback may be a plain function or a coroutine function;
+    coroutines are awaited before the next record is handled.
+    """
+
+    def __init__(self, cb, host, port=const.DEFAULT_PORT, json=True,
+                 text=False, serializer=None, dictionaries=()):
+        """Create new server. It is started by `start()`,
+        or by entering it with `async with`.
+
+        Args:
+            cb (function): Called with each received record
+            host (str): Listen address, or ZeroMQ endpoint
+            port (int): Listen port, if `host` is an address
+            json (bool): If true, records are JSON
+            text (bool): If true (and not JSON), records are text
+            serializer (str|object): JSON backend name or instance,
+                                     see `serialize.get_json()`
+            dictionaries (list): Shared dictionaries for compressed
+                                 messages, see `codec.Decompressor`
+        """
+        self.url = shared.endpoint(host, port)
+        self.cb = cb
+        self._decode = record_decoder(json, text, serializer)
+        self._unpack = Decompressor(dictionaries).unpack
+        self.socket, self._task = None, None
+
+    async def start(self):
+        """Bind the socket and start receiving, in a new task."""
+        _log.event('i', 'server.connect', url=self.url)
+        self.socket = async_context().socket(zmq.PULL)
+        self.socket.bind(self.url)
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        """Stop receiving and close the socket."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.socket is not None:
+            self.socket.close(linger=0)
+            self.socket = None
+
+    async def run(self):
+        while True:
+            frames = self._unpack(await self.socket.recv_multipart())
+            for data in frames:
+                result = self.cb(self._decode(data))
+                if asyncio.iscoroutine(result):
+                    await result
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+
+class AsyncRemote(Observer):
+    """Send events to a remote receiver, without blocking the event loop.
+
+    `event()` only serializes the event and puts it on a queue; a task on
+    the event loop sends everything queued as one multipart message.
+    If the queue is full, or the observer is not started, events
+    are dropped and counted in `dropped`.
+
+    Events may be sent from other threads, too.
+    """
+
+    json_format = True  # if False (and no format), use pickle
+
+    def __init__(self, host, port=const.DEFAULT_PORT, fmt=None,
+                 serializer=None, max_queued=10000, compress=None,
+                 compress_level=None, dictionary=None, **kwargs):
+        """Create new observer. It is started by `start()`,
+        or by entering it with `async with`.
+
+        Args:
+            host (str): Remote host TCP/IP address, or ZeroMQ endpoint
+            port (int): Remote port, if `host` is an address
+            fmt (str): If not None, use format with `TextFormatter`
+            serializer (str|object): JSON backend name or instance,
+                                     see `serialize.get_json()`
+            max_queued (int): Max. number of events waiting to be sent
+            compress (str): Codec to compress messages with,
+                            as for `send.Remote`
+            compress_level (int): Compression level; default is the codec's
+            dictionary (bytes): Shared dictionary for compression
+            kwargs (dict): Keywords for parent class
+        """
+        Observer.__init__(self, **kwargs)
+        self.url = shared.endpoint(host, port)
+        self._pack = None if compress is None else Compressor(
+            compress, level=compress_level, dictionary=dictionary).pack
+        if fmt is not None:
+            self._fmt, self._dump = TextFormatter(fmt), self._dump_text
+        elif self.json_format:
+            self._dump = serialize.get_json(serializer).dumps
+        else:
+            self._dump = self._dump_pickle
+        self.max_queued = max_queued
+        self.dropped = 0
+        self.socket, self._queue, self._task = None, None, None
+        self._loop, self._loop_thread = None, None
+
+    def _dump_text(self, mapping):
+        s = self._fmt.format_event(mapping) + const.REC_SEP
+        return s.encode('utf-8')
+
+    def _dump_pickle(self, mapping):
+        return pickle.dumps(mapping, pickle.HIGHEST_PROTOCOL)
+
+    async def start(self):
+        """Connect the socket and start sending, in a new task."""
+        self._loop = asyncio.get_event_loop()
+        self._loop_thread = threading.current_thread()
+        self._queue = asyncio.Queue(self.max_queued)
+        self.socket = async_context().socket(zmq.PUSH)
+        self.socket.connect(self.url)
+        self._task = asyncio.ensure_future(self._send_events())
+
+    async def close(self, timeout=10):
+        """Send queued events, then close the socket.
+
+        Args:
+            timeout (float): Max. seconds to wait for queued events
+        """
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.socket.close()
+
+    def event(self, mapping):
+        data = self._dump(mapping)
+        if self._loop_thread is threading.current_thread():
+            self._put(data)
+        elif self._loop is not None:
+            self._loop.call_soon_threadsafe(self._put, data)
+        else:
+            self.dropped += 1
+
+    def _put(self, data):
+        try:
+            self._queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _send_events(self):
+        q = self._queue
+        while True:
+            batch = [await q.get()]
+            while not q.empty():
+                batch.append(q.get_nowait())
+            try:
+                await self.socket.send_multipart(
+                    batch if self._pack is None else [self._pack(batch)])
+            finally:
+                for _ in batch:
+                    q.task_done()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
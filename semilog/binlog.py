@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+Compact binary log files, written through a memory map, and a reader.
+
+A log is a series of segment files, `<path>.000000`, `<path>.000001`, ...
+Each segment is preallocated to a fixed size and written through `mmap`,
+and truncated to the used size when it is closed. A segment starts with
+a short file header (magic, version, body codec), followed by records:
+
+    length (u32)  -- of the rest of the record; 0 marks the end
+    type (u8)     -- REC_EVENT or REC_NAME
+    REC_EVENT: ts (f64), severity level (u8), name id (u32), body
+    REC_NAME:  name id (u32), name (UTF-8)
+
+The body holds the other values of the event, encoded with msgpack if
+it is installed, and JSON otherwise. Event names are defined once per
+segment by a REC_NAME record. The length is written last, so readers
+never see a partial record.
+
+Next to each segment, an index file `<segment>.idx` holds the name
+definitions and a sparse index of (timestamp, offset) entries, which
+`read()` uses to seek to a start time without scanning the segment.
+"""
+__author__ = "agent <agent@local>"
+__created__ = "2026-10-16"
+
+import bisect
+import glob
+import mmap
+import os
+import re
+import struct
+import threading
+from . import const, serialize
+from .send import Observer, _flush_at_exit
+
+MAGIC, VERSION = b'SLOG', 1
+CODEC_JSON, CODEC_MSGPACK = 0, 1
+REC_EVENT, REC_NAME = 1, 2
+
+_FILE_HDR = struct.Struct('<4sBB2x')  # magic, version, codec
+_LEN = struct.Struct('<I')
+_EVENT_HDR = struct.Struct('<BdBI')  # type, ts, level, name id
+_NAME_HDR = struct.Struct('<BI')  # type, name id
+_IDX_NAME = struct.Struct('<BIH')  # 'N', name id, name length
+_IDX_POS = struct.Struct('<BdQ')  # 'P', ts, offset
+_IDX_NAME_TAG, _IDX_POS_TAG = ord('N'), ord('P')
+
+
+def _codec(name):
+    """Get (code, encode, decode) for a body codec name."""
+    if name in ('auto', 'msgpack'):
+        try:
+            import msgpack
+            return (CODEC_MSGPACK,
+                    lambda obj: msgpack.packb(
+                        obj, use_bin_type=True,
+                        default=serialize.json_default),
+                    lambda data: msgpack.unpackb(data, raw=False))
+        except ImportError:
+            if name == 'msgpack':
+                raise
+    elif name != 'json':
+        raise ValueError('codec "{}" not in: auto, msgpack, json'.format(name))
+    json = serialize.get_json()
+    return CODEC_JSON, json.dumps, lambda data: json.loads(bytes(data))
+
+def _decoder(code):
+    if code == CODEC_MSGPACK:
+        return _codec('msgpack')[2]
+    return _codec('json')[2]
+
+def segments(path):
+    """Paths of the segments of a log, in order."""
+    pattern = re.compile(re.escape(os.path.basename(path)) + r'\.\d{6}$')
+    return sorted([p for p in glob.glob(glob.escape(path) + '.*')
+                   if pattern.match(os.path.basename(p))])
+
+
+class BinaryLog(Observer):
+    """Write events to a binary log (see module docs).
+    """
+
+    def __init__(self, path, segment_bytes=64 * 1024 * 1024, codec='auto',
+                 index_every=1000, **kwargs):
+        """Create new binary log.
+        Segments are numbered after any that already exist.
+
+        Args:
+            path (str): Base path of segment files
+            segment_bytes (int): Size of each segment
+            codec (str): Codec for record bodies: 'msgpack', 'json', or
+                         'auto' for msgpack if it is installed
+            index_every (int): Add an index entry every this many events
+            kwargs (dict): Keywords for parent class
+        """
+        Observer.__init__(self, **kwargs)
+        self.path, self.segment_bytes = path, segment_bytes
+        self.index_every = index_every
+        self._code, self._encode, _ = _codec(codec)
+        self._fixed_keys = (const.Keys.ts, const.Keys.event, const.Keys.lvl)
+        existing = segments(path)
+        self._seg_num = int(existing[-1].rsplit('.', 1)[1]) + 1 \
+            if existing else 0
+        self._lock = threading.Lock()
+        self._mm = None
+        self._open(segment_bytes)
+        _flush_at_exit.add(self)
+
+    def _open(self, size):
+        """Start a new segment of at least `size` bytes."""
+        self.segment = '{}.{:06d}'.format(self.path, self._seg_num)
+        self._seg_num += 1
+        self._file = open(self.segment, 'w+b')
+        self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        _FILE_HDR.pack_into(self._mm, 0, MAGIC, VERSION, self._code)
+        self._pos, self._size = _FILE_HDR.size, size
+        self._idx = open(self.segment + '.idx', 'wb')
+        self._name_ids, self._n = {}, 0
+
+    def _close_segment(self):
+        self._mm.flush()
+        self._mm.close()
+        self._file.truncate(self._pos)
+        self._file.close()
+        self._idx.close()
+        self._mm = None
+
+    def event(self, mapping):
+        K, fixed = const.Keys, self._fixed_keys
+        keys = tuple(mapping)
+        if keys[-3:] == fixed:  # as added by Subject.event()
+            values = {k: mapping[k] for k in keys[:-3]}
+        else:
+            values = {k: v for k, v in mapping.items() if k not in fixed}
+        body = self._encode(values)
+        name = mapping[K.event]
+        level = min(const.Severity.get(mapping[K.lvl], const.MAX_SEVERITY),
+                    255)
+        ts = mapping[K.ts]
+        with self._lock:
+            n = 4 + _EVENT_HDR.size + len(body)
+            # leave room for a name definition, too
+            need = n + 4 + _NAME_HDR.size + len(name) * 4
+            if self._pos + need > self._size:
+                self._close_segment()
+                self._open(max(self.segment_bytes, need + _FILE_HDR.size))
+            name_id = self._name_ids.get(name, None)
+            if name_id is None:
+                name_id = self._add_name(name)
+            if self._n % self.index_every == 0:
+                self._idx.write(_IDX_POS.pack(_IDX_POS_TAG, ts, self._pos))
+            mm, pos = self._mm, self._pos
+            mm[pos + 4 + _EVENT_HDR.size:pos + n] = body
+            _EVENT_HDR.pack_into(mm, pos + 4, REC_EVENT, ts, level, name_id)
+            _LEN.pack_into(mm, pos, n - 4)
+            self._pos += n
+            self._n += 1
+
+    def _add_name(self, name):
+        """Define a new name in the segment and index.
+        Caller must hold the lock.
+        """
+        name_id = self._name_ids[name] = len(self._name_ids)
+        data = name.encode('utf-8')
+        n = 4 + _NAME_HDR.size + len(data)
+        mm, pos = self._mm, self._pos
+        mm[pos + 4 + _NAME_HDR.size:pos + n] = data
+        _NAME_HDR.pack_into(mm, pos + 4, REC_NAME, name_id)
+        _LEN.pack_into(mm, pos, n - 4)
+        self._pos += n
+        self._idx.write(_IDX_NAME.pack(_IDX_NAME_TAG, name_id, len(data)) +
+                        data)
+        return name_id
+
+    def flush(self):
+        """Flush the memory map and index to disk."""
+        with self._lock:
+            if self._mm is not None:
+                self._mm.flush()
+                self._idx.flush()
+
+    def close(self):
+        """Close the log. The current segment is truncated to its data."""
+        with self._lock:
+            if self._mm is not None:
+                self._close_segment()
+        _flush_at_exit.discard(self)
+
+
+class Segment(object):
+    """Read one segment of a binary log.
+    """
+
+    def __init__(self, path):
+        """Open segment and load its index, if there is one.
+
+        Args:
+            path (str): Path of segment
+        Raises:
+            ValueError: Not a binary log segment
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, code = _FILE_HDR.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not a binary log segment: ' + path)
+        self.decode = _decoder(code)
+        self.names, self._index_ts, self._index_pos = {}, [], []
+        if os.path.exists(path + '.idx'):
+            self._load_index(path + '.idx')
+        self._letters = {}
+        for letter, level in const.Severity.items():
+            self._letters.setdefault(level, letter)
+
+    def _load_index(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        pos = 0
+        while pos < len(data):
+            if data[pos:pos + 1] == b'N':
+                if pos + _IDX_NAME.size > len(data):
+                    break
+                _, name_id, n = _IDX_NAME.unpack_from(data, pos)
+                pos += _IDX_NAME.size
+                self.names[name_id] = data[pos:pos + n].decode('utf-8')
+                pos += n
+            else:
+                if pos + _IDX_POS.size > len(data):
+                    break
+                _, ts, offset = _IDX_POS.unpack_from(data, pos)
+                self._index_ts.append(ts)
+                self._index_pos.append(offset)
+                pos += _IDX_POS.size
+
+    def close(self):
+        """Close the memory map, unless record bodies from `records()`
+        are still referenced; then it is closed when they are released.
+        """
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+
+    def records(self, start=None, end=None):
+        """Iterate over raw event records, without decoding the body.
+
+        Args:
+            start (float): If given, skip events before this time
+            end (float): If given, stop at the first event at/after this time
+        Returns:
+            Iterator over (ts, severity level, name, body memoryview)
+        """
+        mm, names = self._mm, self.names
+        buf = memoryview(mm)
+        size = len(mm)
+        pos = _FILE_HDR.size
+        if start is not None and self._index_ts:
+            i = bisect.bisect_left(self._index_ts, start) - 1
+            if i >= 0:
+                pos = self._index_pos[i]
+        len_size, evt_size = _LEN.size, _EVENT_HDR.size
+        while pos + len_size <= size:
+            n = _LEN.unpack_from(mm, pos)[0]
+            if n == 0 or pos + len_size + n > size:
+                break  # end of data
+            rec_type = mm[pos + len_size]
+            if not isinstance(rec_type, int):
+                rec_type = ord(rec_type)
+            if rec_type == REC_EVENT:
+                _, ts, level, name_id = _EVENT_HDR.unpack_from(
+                    mm, pos + len_size)
+                if end is not None and ts >= end:
+                    break
+                if start is None or ts >= start:
+                    yield (ts, level, names.get(name_id, None),
+                           buf[pos + len_size + evt_size:pos + len_size + n])
+            elif rec_type == REC_NAME:
+                name_id = _NAME_HDR.unpack_from(mm, pos + len_size)[1]
+                names[name_id] = bytes(
+                    buf[pos + len_size + _NAME_HDR.size:pos + len_size + n]
+                ).decode('utf-8')
+            pos += len_size + n
+
+    def events(self, start=None, end=None):
+        """Iterate over events, as mappings.
+        Arguments as for `records()`.
+        """
+        K = const.Keys
+        for ts, level, name, body in self.records(start, end):
+            e = self.decode(body)
+            e[K.ts], e[K.event] = ts, name
+            e[K.lvl] = self._letters.get(level, None)
+            yield e
+
+
+def read(path, start=None, end=None, raw=False):
+    """Iterate over the events in all segments of a binary log.
+
+    Args:
+        path (str): Base path of the log, as given to `BinaryLog`
+        start (float): If given, skip events before this time
+        end (float): If given, stop at the first event at/after this time
+        raw (bool): If true, yield raw records as from `Segment.records()`,
+                    otherwise event mappings
+    """
+    for seg_path in segments(path):
+        seg = Segment(seg_path)
+        try:
+            if end is not None and seg._index_ts and seg._index_ts[0] >= end:
+                break
+            if raw:
+                for rec in seg.records(start, end):
+                    yield rec
+            else:
+                for e in seg.events(start, end):
+                    yield e
+        finally:
+            seg.close()
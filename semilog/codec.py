@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Compression of messages sent by `send.Remote`.
+
+A compressing `Remote` sends each message (one event, or a batch) as one
+frame, which starts with a short header:
+
+    magic (2 bytes)      -- b'\\x00z', which no JSON, pickle or text
+                            record starts with
+    codec (u8)           -- CODEC_ZLIB, CODEC_LZ4 or CODEC_ZSTD
+    dictionary id (u32)  -- see `dictionary_id()`; 0 for none
+
+followed by the compressed records, each one a length (u32) and the
+record bytes. `receive.Server` detects such frames by the magic, and
+passes on other frames as they are, so one server can receive from
+compressing and plain senders.
+
+zlib is always available; lz4 and zstd need the `lz4` and `zstandard`
+modules. Log events repeat the same keys and names, so small messages
+compress much better with a shared dictionary, made from sample events
+with `train_dictionary()`. Senders and receivers are given the same
+dictionary; the id in the header says which one a frame needs.
+"""
+__author__ = "agent <agent@local>"
+__created__ = "2026-10-16"
+
+from collections import Counter
+import re
+import struct
+import threading
+import zlib
+from . import serialize
+
+MAGIC = b'\x00z'
+CODEC_ZLIB, CODEC_LZ4, CODEC_ZSTD = 1, 2, 3
+CODECS = {'zlib': CODEC_ZLIB, 'lz4': CODEC_LZ4, 'zstd': CODEC_ZSTD}
+
+_HDR = struct.Struct('<2sBI')  # magic, codec, dictionary id
+_LEN = struct.Struct('<I')
+_TOKEN = re.compile(br'"(?:[^"\\]|\\.)*"\s*:?\s*|[^\s,:{}\[\]"]+')
+_KEY = re.compile(br'"((?:[^"\\]|\\.)*)"\s*:')
+
+
+def available():
+    """Names of the codecs that can be used here."""
+    names = ['zlib']
+    for name, module in (('lz4', 'lz4.frame'), ('zstd', 'zstandard')):
+        try:
+            __import__(module)
+            names.append(name)
+        except ImportError:
+            pass
+    return names
+
+def dictionary_id(data):
+    """Id of a dictionary, from its contents."""
+    return zlib.crc32(data) & 0xffffffff or 1
+
+def train_dictionary(samples, size=16384, codec='zlib'):
+    """Make a shared dictionary from sample events.
+
+    For zstd, this uses its dictionary trainer, which wants at least
+    a few hundred samples. Otherwise, the dictionary is made of the
+    strings (keys, names, values) that occur most often in the samples,
+    with the most useful ones at the end, where zlib finds them first.
+
+    Args:
+        samples (list): Events (dicts), or serialized events (bytes)
+        size (int): Max. size of dictionary, in bytes
+        codec (str): Codec the dictionary is for
+    Returns:
+        (bytes) Dictionary
+    """
+    dumps = serialize.get_json().dumps
+    samples = [s if isinstance(s, bytes) else dumps(s) for s in samples]
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.train_dictionary(size, samples).as_bytes()
+    counts = Counter()
+    for sample in samples:
+        counts.update(_TOKEN.findall(sample))
+    tokens = sorted([t for t, n in counts.items() if n > 1],
+                    key=lambda t: counts[t] * len(t), reverse=True)
+    # whole samples, one per layout of keys, match the longest strings
+    layouts = {}
+    for sample in samples:
+        layouts.setdefault(tuple(_KEY.findall(sample)), sample)
+    result, total = [], 0
+    for token in sorted(layouts.values(), key=len)[:4] + tokens:
+        if total + len(token) > size:
+            break
+        result.append(token)
+        total += len(token)
+    return b''.join(reversed(result))
+
+
+class Compressor(object):
+    """Pack messages into one compressed frame.
+    """
+
+    def __init__(self, codec='zlib', level=None, dictionary=None):
+        """Create new compressor.
+
+        Args:
+            codec (str): One of the names in `CODECS`, see `available()`
+            level (int): Compression level; default is the codec's
+            dictionary (bytes): Shared dictionary (zlib and zstd only)
+        Raises:
+            ValueError: Unknown codec, or dictionary given for lz4
+            ImportError: Module for codec is not installed
+        """
+        if codec not in CODECS:
+            raise ValueError('codec "{}" not in: {}'.format(
+                codec, ', '.join(sorted(CODECS))))
+        self.codec, self.level, self.dictionary = codec, level, dictionary
+        dict_id = 0 if dictionary is None else dictionary_id(dictionary)
+        self._header = _HDR.pack(MAGIC, CODECS[codec], dict_id)
+        self._local = threading.local()
+        if codec == 'zlib':
+            level = -1 if level is None else level
+            if dictionary is None:
+                self._compress = lambda data: zlib.compress(data, level)
+            else:
+                primed = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS,
+                                          zlib.DEF_MEM_LEVEL,
+                                          zlib.Z_DEFAULT_STRATEGY, dictionary)
+                def compress(data):
+                    c = primed.copy()
+                    return c.compress(data) + c.flush()
+                self._compress = compress
+        elif codec == 'lz4':
+            if dictionary is not None:
+                raise ValueError('lz4 codec does not use a dictionary')
+            import lz4.frame
+            self._compress = lambda data: lz4.frame.compress(
+                data, compression_level=level or 0)
+        else:
+            import zstandard
+            self._zstd_args = {'level': 3 if level is None else level}
+            if dictionary is not None:
+                self._zstd_args['dict_data'] = \
+                    zstandard.ZstdCompressionDict(dictionary)
+            self._compress = self._compress_zstd
+
+    def _compress_zstd(self, data):
+        try:
+            c = self._local.zstd
+        except AttributeError:  # one per thread, they are not thread-safe
+            import zstandard
+            c = self._local.zstd = zstandard.ZstdCompressor(
+                **self._zstd_args)
+        return c.compress(data)
+
+    def pack(self, records):
+        """Compress records into one frame.
+
+        Args:
+            records (list): Serialized records (bytes)
+        Returns:
+            (bytes) Frame, with header
+        """
+        parts = []
+        for data in records:
+            parts.append(_LEN.pack(len(data)))
+            parts.append(data)
+        return self._header + self._compress(b''.join(parts))
+
+
+class Decompressor(object):
+    """Unpack records from compressed frames.
+    """
+
+    def __init__(self, dictionaries=()):
+        """Create new decompressor.
+
+        Args:
+            dictionaries (list): Shared dictionaries (bytes) that senders
+                                 may use
+        """
+        self.dictionaries = dict([(dictionary_id(d), d)
+                                  for d in dictionaries])
+        self._local = threading.local()
+
+    def __getstate__(self):  # for worker processes
+        return {'dictionaries': self.dictionaries}
+
+    def __setstate__(self, state):
+        self.dictionaries = state['dictionaries']
+        self._local = threading.local()
+
+    def unpack(self, frames):
+        """Get records from frames.
+
+        Args:
+            frames (list): Received frames; those that are not compressed
+                           are records already
+        Returns:
+            (list) Records (bytes)
+        Raises:
+            ValueError: Unknown codec or dictionary
+        """
+        records = None
+        for i, data in enumerate(frames):
+            if data[:2] != MAGIC:
+                if records is not None:
+                    records.append(data)
+                continue
+            if records is None:
+                records = list(frames[:i])
+            _, code, dict_id = _HDR.unpack_from(data)
+            body = self._decompress(code, dict_id, data[_HDR.size:])
+            j, n = 0, len(body)
+            while j < n:
+                size = _LEN.unpack_from(body, j)[0]
+                j += _LEN.size
+                records.append(body[j:j + size])
+                j += size
+        return frames if records is None else records
+
+    def _decompress(self, code, dict_id, data):
+        if dict_id:
+            try:
+                dictionary = self.dictionaries[dict_id]
+            except KeyError:
+                raise ValueError('unknown dictionary: {:08x}'.format(dict_id))
+        if code == CODEC_ZLIB:
+            if not dict_id:
+                return zlib.decompress(data)
+            return zlib.decompressobj(zdict=dictionary).decompress(data)
+        if code == CODEC_LZ4:
+            import lz4.frame
+            return lz4.frame.decompress(data)
+        if code == CODEC_ZSTD:
+            d = getattr(self._local, 'zstd', {}).get(dict_id, None)
+            if d is None:
+                import zstandard
+                kw = {} if not dict_id else {
+                    'dict_data': zstandard.ZstdCompressionDict(dictionary)}
+                d = zstandard.ZstdDecompressor(**kw)
+                self._local.__dict__.setdefault('zstd', {})[dict_id] = d
+            return d.decompress(data)
+        raise ValueError('unknown codec: {:d}'.format(code))
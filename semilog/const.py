@@ -10,6 +10,14 @@ class Keys(object):
     event = 'event'
     lvl = severity = 'severity'
 
+# Policies for a full async. queue, see Subject
+class Overflow(object):
+    block = 'block'  # wait for space
+    drop_newest = 'drop-newest'  # discard the new event
+    drop_oldest = 'drop-oldest'  # discard the oldest queued event
+    spill = 'spill'  # write events to disk until the queue catches up
+    all = (block, drop_newest, drop_oldest, spill)
+
 MAX_SEVERITY = 99  #: anything higher will be ignored
 
 #: Letter codes for message severity level
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Filters that limit the events an observer accepts.
+
+Filters are given to an observer with its `filters` keyword, e.g.
+
+    Remote(host, filters=[RateLimit(100, key='event'), Sample(0.1)])
+
+An observer's filters are called in order, after its severity check, by
+`Observer.accept()`, and an event is accepted only if they all pass it.
+This happens before the event is copied, queued or serialized.
+
+Filters group events by a key: the value of one key of the event
+(by default, the event name), a tuple of the values of several keys,
+or the result of a function of the event. Each filter counts the events
+it suppressed, in total and by key.
+"""
+__author__ = "agent <agent@local>"
+__created__ = "2026-10-16"
+
+import random
+import threading
+import time
+from . import const
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class Filter(object):
+    """Base class for event filters.
+
+    Subclasses implement `passes(key, mapping)`.
+    """
+
+    def __init__(self, key=const.Keys.event):
+        """Create new filter.
+
+        Args:
+            key (str|tuple|function): Name of key to group events by,
+                                      or names of keys, or a function
+                                      of the event that returns the group
+        """
+        if callable(key):
+            self._key = key
+        elif isinstance(key, (tuple, list)):
+            keys = tuple(key)
+            self._key = lambda m: tuple([m.get(k, None) for k in keys])
+        else:
+            self._key = lambda m: m.get(key, None)
+        self.key = key
+        self._lock = threading.Lock()
+        self.suppressed = 0
+        self.suppressed_by = {}
+
+    def __call__(self, mapping):
+        """Pass (return True) or suppress (return False) an event."""
+        key = self._key(mapping)
+        if self.passes(key, mapping):
+            return True
+        with self._lock:
+            self.suppressed += 1
+            self.suppressed_by[key] = self.suppressed_by.get(key, 0) + 1
+        return False
+
+    def passes(self, key, mapping):
+        return True
+
+    def stats(self):
+        """Counts of suppressed events.
+
+        Returns:
+            (dict) Total in `suppressed` and dict by key in `suppressed_by`
+        """
+        with self._lock:
+            return {'suppressed': self.suppressed,
+                    'suppressed_by': dict(self.suppressed_by)}
+
+
+class Sample(Filter):
+    """Pass a random fraction of events.
+    """
+
+    def __init__(self, rate=1.0, rates=None, **kwargs):
+        """Create new filter.
+
+        Args:
+            rate (float): Fraction of events to pass, 0 to 1
+            rates (dict): Fractions for some keys, e.g. event names,
+                          in place of `rate`
+            kwargs (dict): Keywords for parent class
+        """
+        Filter.__init__(self, **kwargs)
+        self.rate, self.rates = rate, rates or {}
+        self._random = random.random
+
+    def passes(self, key, mapping):
+        rate = self.rates.get(key, self.rate)
+        return rate >= 1 or self._random() < rate
+
+
+class RateLimit(Filter):
+    """Pass at most `rate` events per second, with bursts of up to `burst`
+    events, for each key (a token bucket for each).
+    """
+
+    def __init__(self, rate, burst=None, max_keys=10000, **kwargs):
+        """Create new filter.
+
+        Args:
+            rate (float): Events per second
+            burst (int): Size of burst, default is `rate` (but at least 1)
+            max_keys (int): Forget all buckets when there are more
+                            than this many keys
+            kwargs (dict): Keywords for parent class
+        """
+        Filter.__init__(self, **kwargs)
+        self.rate = float(rate)
+        self.burst = max(rate, 1) if burst is None else burst
+        self.max_keys = max_keys
+        self._buckets = {}  # {key: [tokens, time]}
+
+    def passes(self, key, mapping):
+        now = _clock()
+        with self._lock:
+            bucket = self._buckets.get(key, None)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._buckets.clear()
+                bucket = self._buckets[key] = [self.burst, now]
+            else:
+                bucket[0] = min(self.burst,
+                                bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True
+            return False
+
+
+class EveryKth(Filter):
+    """Pass the first `first` events, then every `every`-th one, for
+    each key. For example, to stop one event in a loop from flooding the
+    log, while still showing it is happening:
+
+        EveryKth(first=10, every=1000, key=('event', 'msg'))
+    """
+
+    def __init__(self, first=1, every=100, window=None, max_keys=10000,
+                 **kwargs):
+        """Create new filter.
+
+        Args:
+            first (int): Number of events to pass before sampling
+            every (int): Then pass one event in this many
+            window (float): If given, start counting again for a key after
+                            this many seconds
+            max_keys (int): Forget all counts when there are more
+                            than this many keys
+            kwargs (dict): Keywords for parent class
+        """
+        Filter.__init__(self, **kwargs)
+        self.first, self.every, self.window = first, every, window
+        self.max_keys = max_keys
+        self._counts = {}  # {key: [count, start time]}
+
+    def passes(self, key, mapping):
+        with self._lock:
+            count = self._counts.get(key, None)
+            if count is None or (self.window is not None and
+                                 _clock() - count[1] >= self.window):
+                if count is None and len(self._counts) >= self.max_keys:
+                    self._counts.clear()
+                count = self._counts[key] = [0, _clock()]
+            n = count[0]
+            count[0] = n + 1
+        return n < self.first or (n - self.first + 1) % self.every == 0
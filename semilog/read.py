@@ -0,0 +1,638 @@
+# -*- coding: utf-8 -*-
+"""
+Read logs written by a `Stream` back into events, and query them.
+
+JSON and text logs are read a line at a time, and pickled logs an object
+at a time, so memory use does not depend on the size of the log.
+Text logs are parsed with the format string that wrote them, see
+`TextParser`. Files ending in '.gz' are decompressed as they are read.
+
+Events are selected with a `Query` (event name, severity, time window,
+and predicates on other keys), optionally projected to some of their keys,
+and can be summarized with a `Summary` (counts, and statistics of a
+numeric key). With `processes`, JSON and text files are split into chunks
+that are parsed by a pool of processes.
+
+Command-line usage: `python -m semilog.read --help`
+"""
+__author__ = "agent <agent@local>"
+__created__ = "2026-10-16"
+
+import argparse
+import calendar
+from collections import deque
+from datetime import datetime
+import fnmatch
+import gzip
+import math
+import operator
+import os
+import re
+import string
+import sys
+import time
+import six
+from six.moves import cPickle as pickle
+from . import const
+from .send import severity_level
+from .serialize import get_json
+from .timer import Histogram
+
+FORMATS = ('json', 'text', 'pickle')
+
+#: Split files into chunks of this many bytes for parallel reading
+CHUNK_BYTES = 16 * 1024 * 1024
+
+
+def _convert(s):
+    """Convert text value to int or float, if it looks like one."""
+    try:
+        return int(s)
+    except ValueError:
+        pass
+    try:
+        return float(s)
+    except ValueError:
+        return s
+
+
+class TextParser(object):
+    """Parse lines written by `TextFormatter` back into events.
+
+    The format string is turned into a regular expression with a group
+    for each field. The derived `level` and `isotime` fields are converted
+    back to `severity` and `ts`, and the pairs in `kvp` are added to the
+    event. Values that look like numbers are converted to int or float.
+    Text formats are lossy: e.g. values with spaces are only quoted in
+    `kvp`, so other fields with spaces may not parse as intended.
+    """
+
+    _kvp_re = re.compile(r'([^\s=]+)=("(?:[^"\\]|\\.)*"|\S*)')
+
+    def __init__(self, format_str, utc=False):
+        """Create new parser.
+
+        Args:
+            format_str (str): Format string given to `TextFormatter`
+            utc (bool): If true, `isotime` is in UTC
+        """
+        self.format_str, self.utc = format_str, utc
+        self._sev = dict([(v, k) for k, v in const.Levelname.items()])
+        parts, self.fields = [], []
+        parsed = list(string.Formatter().parse(format_str))
+        for i, (literal, key, spec, conv) in enumerate(parsed):
+            parts.append(re.escape(literal))
+            if key is None:
+                continue
+            last = (i == len(parsed) - 1)
+            pat = '.*' if last else '.*?'
+            if not re.match(r'[^\W\d]\w*$', key) or key in self.fields:
+                parts.append('(?:{})'.format(pat))
+            else:
+                self.fields.append(key)
+                parts.append('(?P<{}>{})'.format(key, pat))
+        self._re = re.compile(''.join(parts) + '$')
+
+    def parse(self, line):
+        """Parse one line (without the record separator).
+
+        Returns:
+            (dict) Event, or None if the line does not match the format
+        """
+        match = self._re.match(line)
+        if match is None:
+            return None
+        K, e = const.Keys, {}
+        for key, value in match.groupdict().items():
+            if key == 'kvp':
+                for k, v in self._kvp_re.findall(value):
+                    if v.startswith('"') and len(v) > 1:
+                        e[k] = v[1:-1].replace('\\"', '"')
+                    elif k == K.lvl:
+                        e[k] = self._sev.get(v, v)
+                    else:
+                        e[k] = _convert(v)
+            elif key == 'level':
+                e[K.lvl] = self._sev.get(value, value)
+            elif key == 'isotime':
+                e[K.ts] = self.parse_isotime(value)
+            elif key in (K.event, K.lvl):
+                e[key] = value
+            else:
+                e[key] = _convert(value)
+        return e
+
+    def parse_isotime(self, s):
+        """Timestamp from ISO8601 date and time, as written by `IsoTime`."""
+        if s.endswith('Z'):
+            s = s[:-1]
+        s, _, frac = s.partition('.')
+        dt = datetime.strptime(s, '%Y-%m-%dT%H:%M:%S')
+        sec = calendar.timegm(dt.timetuple()) if self.utc \
+            else time.mktime(dt.timetuple())
+        return sec + (int(frac) / (10. ** len(frac)) if frac else 0)
+
+
+class Predicate(object):
+    """Test on the value of one key of an event, e.g. 'dur>=1.5'.
+
+    Operators are: `==`, `!=`, `<`, `<=`, `>`, `>=`, and `~` for a regular
+    expression search. Values are compared as numbers if both sides are
+    numbers, and as strings otherwise. Events without the key never match.
+    """
+
+    OPS = {'==': operator.eq, '!=': operator.ne, '<=': operator.le,
+           '>=': operator.ge, '<': operator.lt, '>': operator.gt,
+           '~': None}
+    _expr_re = re.compile(r'\s*([^=!<>~\s]+)\s*(==|!=|<=|>=|<|>|~)\s*(.*)$')
+
+    def __init__(self, expr):
+        """Create new predicate.
+
+        Args:
+            expr (str): Expression: key, operator, value
+        Raises:
+            ValueError: Bad expression
+        """
+        match = self._expr_re.match(expr)
+        if match is None:
+            raise ValueError('bad predicate "{}", expected <key><op><value> '
+                             'with op one of: {}'.format(
+                                 expr, ' '.join(sorted(self.OPS))))
+        self.key, self.op, value = match.groups()
+        if self.op == '~':
+            self._regex = re.compile(value)
+        self.value = _convert(value)
+
+    def __call__(self, mapping):
+        if self.key not in mapping:
+            return False
+        v = mapping[self.key]
+        if self.op == '~':
+            return self._regex.search(format(v, '')) is not None
+        target = self.value
+        if isinstance(v, (int, float)) != isinstance(target, (int, float)):
+            v, target = format(v, ''), format(target, '')
+        try:
+            return self.OPS[self.op](v, target)
+        except TypeError:
+            return False
+
+
+class Query(object):
+    """Select and project events.
+
+    All given conditions must match for an event to be selected.
+    Queries are picklable (if their predicates are), so they can be
+    sent to worker processes.
+    """
+
+    def __init__(self, event=None, severity=None, start=None, end=None,
+                 where=None, fields=None):
+        """Create new query.
+
+        Args:
+            event (str|list): Event name(s), which may be shell-style
+                              patterns like 'server.*'
+            severity (str|int): Select events at this severity, or worse
+            start (float): Select events at or after this time
+            end (float): Select events before this time
+            where (list): Predicates, either functions of the event
+                          or strings for `Predicate`
+            fields (list): If given, keys to keep in selected events
+        """
+        if isinstance(event, six.string_types):
+            event = [event]
+        self.event = event
+        self._names, self._patterns = None, None
+        if event:
+            self._names = set([e for e in event if not self._is_pattern(e)])
+            self._patterns = [e for e in event if self._is_pattern(e)]
+        self.level = None if severity is None else severity_level(severity)
+        self.start, self.end = start, end
+        self.where = [Predicate(w) if isinstance(w, six.string_types)
+                      else w for w in (where or [])]
+        self.fields = fields
+
+    @staticmethod
+    def _is_pattern(s):
+        return any([c in s for c in '*?['])
+
+    def match(self, e):
+        K = const.Keys
+        if self._names is not None:
+            name = e.get(K.event, None)
+            if name not in self._names and not any(
+                    [fnmatch.fnmatchcase(name or '', p)
+                     for p in self._patterns]):
+                return False
+        if self.level is not None and const.Severity.get(
+                e.get(K.lvl, None), const.MAX_SEVERITY) > self.level:
+            return False
+        if self.start is not None or self.end is not None:
+            ts = e.get(K.ts, None)
+            if ts is None or (self.start is not None and ts < self.start) or \
+                    (self.end is not None and ts >= self.end):
+                return False
+        for pred in self.where:
+            if not pred(e):
+                return False
+        return True
+
+    def project(self, e):
+        if self.fields is None:
+            return e
+        return dict([(k, e[k]) for k in self.fields if k in e])
+
+    def __call__(self, events):
+        """Iterate over selected, projected, events."""
+        match, project = self.match, self.project
+        for e in events:
+            if match(e):
+                yield project(e)
+
+
+class Summary(object):
+    """Count events, and compute statistics of a numeric key,
+    optionally grouped by the value of another key.
+
+    Values of the numeric key are counted in logarithmic buckets, like
+    those of `timer.Histogram`, so memory use does not grow with the
+    number of events; percentiles are within about 1.5% of the exact
+    value. Values that are not finite are skipped. Summaries of parts
+    of a log are combined with `merge()`.
+    """
+
+    def __init__(self, key=None, by=None, percentiles=(50, 90, 99)):
+        """Create new, empty, summary.
+
+        Args:
+            key (str): Numeric key for statistics, or None for counts only
+            by (str): Group by values of this key, e.g. 'event'
+            percentiles (list): Percentiles to compute, 0 to 100
+        """
+        self.key, self.by, self.percentiles = key, by, percentiles
+        # {group: [count, n values, sum, min, max, {bucket: count}]}
+        self._groups = {}
+
+    @staticmethod
+    def _bucket(v):
+        """Bucket of a value, as (sign, bucket), in order of value."""
+        if v > 0:
+            return 1, Histogram.bucket(v)
+        if v < 0:
+            return -1, -Histogram.bucket(-v)
+        return 0, 0
+
+    @staticmethod
+    def _bucket_value(bucket):
+        sign, b = bucket
+        return sign * Histogram.value(b * sign) if sign else 0.
+
+    def add(self, e):
+        name = e.get(self.by, None) if self.by else None
+        group = self._groups.get(name, None)
+        if group is None:
+            group = self._groups[name] = [0, 0, 0., None, None, {}]
+        group[0] += 1
+        if self.key is not None:
+            v = e.get(self.key, None)
+            if isinstance(v, (int, float)) and \
+                    not (math.isinf(v) or math.isnan(v)):
+                group[1] += 1
+                group[2] += v
+                if group[3] is None or v < group[3]:
+                    group[3] = v
+                if group[4] is None or v > group[4]:
+                    group[4] = v
+                b, counts = self._bucket(v), group[5]
+                counts[b] = counts.get(b, 0) + 1
+
+    def update(self, events):
+        for e in events:
+            self.add(e)
+
+    def merge(self, other):
+        """Add counts and values of another summary to this one."""
+        for name, (count, n, total, lo, hi, counts) in other._groups.items():
+            group = self._groups.setdefault(name, [0, 0, 0., None, None, {}])
+            group[0] += count
+            group[1] += n
+            group[2] += total
+            if lo is not None and (group[3] is None or lo < group[3]):
+                group[3] = lo
+            if hi is not None and (group[4] is None or hi > group[4]):
+                group[4] = hi
+            for b, c in counts.items():
+                group[5][b] = group[5].get(b, 0) + c
+
+    def result(self):
+        """Statistics, as a dict with `count` and, if there is a numeric
+        key, `min`, `max`, `mean` and `p<N>` for each percentile.
+        If grouped, this is a dict of these, by group value.
+        """
+        result = {}
+        for name, (count, n, total, lo, hi, counts) in self._groups.items():
+            r = result[name] = {'count': count}
+            if self.key is None or not n:
+                continue
+            r.update({'min': lo, 'max': hi, 'mean': total / n})
+            buckets = sorted(counts)
+            for p in self.percentiles:
+                rank, seen = min(max(int(math.ceil(p / 100. * n)), 1), n), 0
+                for b in buckets:
+                    seen += counts[b]
+                    if seen >= rank:
+                        break
+                v = min(max(self._bucket_value(b), lo), hi)
+                r['p{:g}'.format(p)] = v
+        if self.by is None:
+            return result.get(None, {'count': 0})
+        return result
+
+
+def detect_format(path):
+    """Guess format of a log from its first byte."""
+    with _open(path) as f:
+        first = f.read(1)
+    if first == b'{':
+        return 'json'
+    if first == b'\x80':
+        return 'pickle'
+    return 'text'
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+def _decoder(format, fmt, utc, serializer):
+    """Function to decode one line of a JSON or text log, and the
+    exceptions it raises for lines that can't be decoded.
+    """
+    if format == 'json':
+        json = get_json(serializer)
+        return json.loads, getattr(json, 'decode_errors', (ValueError,))
+    if fmt is None:
+        raise ValueError('format string is required to parse text')
+    parse = TextParser(fmt, utc=utc).parse
+    return (lambda line: parse(line.decode('utf-8'))), (ValueError,)
+
+def _read_lines(f, decoder, end=None):
+    """Decode lines from `f` with `decoder`, from `_decoder()`, skipping
+    those that can't be decoded.
+    If `end` is given, stop at the first line starting after it.
+    """
+    decode, errors = decoder
+    sep = const.REC_SEP.encode('utf-8')
+    pos = f.tell()
+    for line in f:
+        if end is not None and pos >= end:
+            break
+        pos += len(line)
+        line = line.rstrip(sep)
+        if not line:
+            continue
+        try:
+            e = decode(line)
+        except errors:
+            continue
+        if e is not None:
+            yield e
+
+def _read_pickle(f):
+    while True:
+        try:
+            yield pickle.load(f)
+        except EOFError:
+            break
+
+def read(path, format=None, fmt=None, utc=False, serializer=None,
+         query=None):
+    """Iterate over the events in a log.
+
+    Args:
+        path (str): Log file
+        format (str): One of `FORMATS`, or None to detect it
+        fmt (str): Format string for text logs
+        utc (bool): If true, times in text logs are UTC
+        serializer (str|object): JSON backend name or instance,
+                                 see `serialize.get_json()`
+        query (Query): If given, select events with this query
+    Raises:
+        ValueError: Bad format, or missing format string
+    """
+    if format is None:
+        format = 'text' if fmt is not None else detect_format(path)
+    if format not in FORMATS:
+        raise ValueError('format "{}" not in: {}'.format(
+            format, ', '.join(FORMATS)))
+    decoder = None if format == 'pickle' else \
+        _decoder(format, fmt, utc, serializer)
+    with _open(path) as f:
+        if decoder is None:
+            events = _read_pickle(f)
+        else:
+            events = _read_lines(f, decoder)
+        if query is not None:
+            events = query(events)
+        for e in events:
+            yield e
+
+def _chunks(path, chunk_bytes):
+    size = os.path.getsize(path)
+    return [(start, min(start + chunk_bytes, size))
+            for start in range(0, size, chunk_bytes)]
+
+def _read_chunk(args):
+    """Read events in one chunk of a file, in a worker process.
+    The chunk has the lines that start within it.
+
+    Returns:
+        List of events, or Summary if one was given
+    """
+    path, start, end, format, fmt, utc, serializer, query, summary = args
+    decoder = _decoder(format, fmt, utc, serializer)
+    with open(path, 'rb') as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline()  # skip the line that started in the last chunk
+        events = _read_lines(f, decoder, end=end)
+        if query is not None:
+            events = query(events)
+        if summary is not None:
+            summary.update(events)
+            return summary
+        return list(events)
+
+def _chunk_args(path, format, fmt, utc, serializer, query, summary,
+                chunk_bytes):
+    if format is None:
+        format = 'text' if fmt is not None else detect_format(path)
+    if format == 'pickle' or path.endswith('.gz'):
+        return None  # can't split
+    empty = None if summary is None else \
+        Summary(summary.key, summary.by, summary.percentiles)
+    return [(path, start, end, format, fmt, utc, serializer, query, empty)
+            for start, end in _chunks(path, chunk_bytes)]
+
+def _imap(pool, processes, fn, args):
+    """Like `pool.imap()`, but with at most two tasks per process that are
+    submitted and whose results have not been taken, so results don't
+    pile up in memory when they are taken more slowly than they are made.
+    """
+    pending, max_pending = deque(), 2 * processes
+    for a in args:
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+        pending.append(pool.apply_async(fn, (a,)))
+    while pending:
+        yield pending.popleft().get()
+
+def read_parallel(path, processes=None, chunk_bytes=CHUNK_BYTES, **kwargs):
+    """Iterate over the events in a log, in order, parsing chunks of it
+    in a pool of processes.
+
+    Pickled and compressed logs can't be split, and are read by `read()`.
+    At most two chunks of events per process are held in memory at once.
+
+    Args:
+        path (str): Log file
+        processes (int): Number of processes, default is number of CPUs
+        chunk_bytes (int): Size of chunks
+        kwargs (dict): Keywords for `read()`
+    """
+    args = _chunk_args(path, kwargs.get('format', None),
+                       kwargs.get('fmt', None), kwargs.get('utc', False),
+                       kwargs.get('serializer', None),
+                       kwargs.get('query', None), None, chunk_bytes)
+    if args is None:
+        for e in read(path, **kwargs):
+            yield e
+        return
+    import multiprocessing
+    processes = processes or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes)
+    try:
+        for events in _imap(pool, processes, _read_chunk, args):
+            for e in events:
+                yield e
+    finally:
+        pool.terminate()
+
+def summarize(paths, summary, processes=None, chunk_bytes=CHUNK_BYTES,
+              **kwargs):
+    """Summarize the events in one or more logs.
+
+    Args:
+        paths (list): Log files
+        summary (Summary): Add events to this summary
+        processes (int): If given, parse chunks of files in a pool of
+                         this many processes (0 for number of CPUs)
+        chunk_bytes (int): Size of chunks
+        kwargs (dict): Keywords for `read()`
+    Returns:
+        (Summary) The `summary` argument
+    """
+    if isinstance(paths, six.string_types):
+        paths = [paths]
+    pool = None
+    if processes is not None:
+        import multiprocessing
+        processes = processes or multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(processes)
+    try:
+        for path in paths:
+            args = None if pool is None else _chunk_args(
+                path, kwargs.get('format', None), kwargs.get('fmt', None),
+                kwargs.get('utc', False), kwargs.get('serializer', None),
+                kwargs.get('query', None), summary, chunk_bytes)
+            if args is None:
+                summary.update(read(path, **kwargs))
+            else:
+                for part in _imap(pool, processes, _read_chunk, args):
+                    summary.merge(part)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return summary
+
+
+def _parse_time(s):
+    """Time from seconds since the epoch, or local ISO8601 date and time,
+    to a precision of days, minutes, seconds or fractions of a second.
+    """
+    try:
+        return float(s)
+    except ValueError:
+        pass
+    s, _, frac = s.partition('.')
+    for time_fmt in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            dt = datetime.strptime(s, time_fmt)
+            break
+        except ValueError:
+            pass
+    else:
+        raise argparse.ArgumentTypeError('bad time: ' + s)
+    return time.mktime(dt.timetuple()) + (float('.' + frac) if frac else 0)
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        description='Select and summarize events from semilog log files')
+    p.add_argument('files', nargs='+', metavar='FILE')
+    p.add_argument('-f', '--format', choices=FORMATS, default=None,
+                   help='Log format (default: detect)')
+    p.add_argument('--fmt', default=None, metavar='FORMAT',
+                   help='Format string that wrote a text log')
+    p.add_argument('--utc', action='store_true',
+                   help='Times in text log are UTC')
+    p.add_argument('-e', '--event', action='append', metavar='NAME',
+                   help='Event name or pattern (repeatable)')
+    p.add_argument('-s', '--severity', default=None, metavar='LEVEL',
+                   help='Severity letter; select this level and worse')
+    p.add_argument('--start', type=_parse_time, default=None,
+                   help='Start time, seconds or ISO8601 (local time)')
+    p.add_argument('--end', type=_parse_time, default=None,
+                   help='End time, seconds or ISO8601 (local time)')
+    p.add_argument('-w', '--where', action='append', metavar='EXPR',
+                   help='Predicate like "dur>1" or "msg~timeout" '
+                        '(repeatable)')
+    p.add_argument('-k', '--keys', default=None, metavar='K1,K2,...',
+                   help='Output only these keys')
+    p.add_argument('-c', '--count', action='store_true',
+                   help='Output only counts of events')
+    p.add_argument('--stats', default=None, metavar='KEY',
+                   help='Output statistics of numeric key')
+    p.add_argument('--by', default=None, metavar='KEY',
+                   help='Group counts/statistics by this key, e.g. event')
+    p.add_argument('-p', '--processes', type=int, default=None, metavar='N',
+                   help='Parse in N processes (0 for number of CPUs)')
+    args = p.parse_args(argv)
+    try:
+        query = Query(event=args.event, severity=args.severity,
+                      start=args.start, end=args.end, where=args.where,
+                      fields=args.keys.split(',') if args.keys else None)
+    except (ValueError, KeyError) as err:
+        p.error(str(err))
+    kwargs = dict(format=args.format, fmt=args.fmt, utc=args.utc,
+                  query=query)
+    json = get_json()
+    if args.count or args.stats or args.by:
+        summary = Summary(key=args.stats, by=args.by)
+        summarize(args.files, summary, processes=args.processes, **kwargs)
+        print(json.dumps_text(summary.result()))
+        return 0
+    out = sys.stdout
+    for path in args.files:
+        if args.processes is None:
+            events = read(path, **kwargs)
+        else:
+            events = read_parallel(path, processes=args.processes or None,
+                                   **kwargs)
+        for e in events:
+            out.write(json.dumps_text(e) + const.REC_SEP)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
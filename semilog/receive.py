@@ -5,31 +5,178 @@ Receive logs
 __author__ = 'Dan Gunter <dkgunter@lbl.gov>'
 __date__ = '2014-11-27'
 
+from six.moves import cPickle as pickle
+from six.moves import queue
 import threading
+import time
 import zmq
 from .const import DEFAULT_PORT
 from . import NullSubject
+from .codec import Decompressor
+from .serialize import get_json
+from . import shared
 from .shared import registry
 
 _log = registry.get('internal', NullSubject())
 
+def _decode_text(data):
+    return data.decode('utf-8')
+
+def record_decoder(json=True, text=False, serializer=None):
+    """Get function to decode one received record.
+
+    Args:
+        json (bool): If true, records are JSON
+        text (bool): If true (and not JSON), records are text.
+                     If both are false, records are pickled.
+        serializer (str|object): JSON backend name or instance,
+                                 see `serialize.get_json()`
+    """
+    if json:
+        return get_json(serializer).loads
+    if text:
+        return _decode_text
+    return pickle.loads
+
+def to_columns(records):
+    """Convert a list of records (dicts) to a dict of lists, one per key.
+    Records without a given key have None in its list.
+    """
+    cols, n = {}, 0
+    for rec in records:
+        for k, v in rec.items():
+            col = cols.get(k, None)
+            if col is None:
+                col = cols[k] = [None] * n
+            col.append(v)
+        n += 1
+        for col in cols.values():
+            if len(col) < n:
+                col.append(None)
+    return cols
+
+def _work(queue, unpack, decode, cb, batch_cb, columnar, stats):
+    """Worker loop: decode messages from `queue` and pass records to `cb`,
+    or lists of them to `batch_cb`, until None is received.
+    Counts go in `stats` as [messages, records, errors].
+    """
+    while True:
+        frames = queue.get()
+        if frames is None:
+            break
+        try:
+            frames = unpack(frames)
+        except Exception as err:
+            stats[2] += 1
+            _log.event('e', 'server.decode.error', msg=str(err))
+            continue
+        if batch_cb is not None:
+            try:
+                records = [decode(data) for data in frames]
+                batch_cb(to_columns(records) if columnar else records)
+            except Exception as err:
+                stats[2] += 1
+                _log.event('e', 'server.callback.error', msg=str(err))
+        else:
+            for data in frames:
+                try:
+                    cb(decode(data))
+                except Exception as err:
+                    stats[2] += 1
+                    _log.event('e', 'server.callback.error', msg=str(err))
+        stats[1] += len(frames)
+        stats[0] += 1
+
+
 class Server(object):
+    """Receive records sent by `send.Remote` observers.
+
+    Each part of a multipart message, as sent by a batching `Remote`,
+    is passed to the callback as a separate record.
 
-    def __init__(self, cb, host, port=DEFAULT_PORT, json=True, text=False):
-        url = "tcp://{}:{:d}".format(host, port)
+    By default, messages are decoded and passed to the callback by the
+    receiving thread. If `workers` is given, the receiving thread only
+    reads messages and puts them on a bounded queue, and that many worker
+    threads (or processes) decode them and call the callback. With
+    `ordered`, all messages from the same peer address go to the same
+    worker, so each sender's records are handled in order.
+
+    If `batch_cb` is given, it is called with lists of records instead.
+    All messages that are waiting are read at once, and a batch is passed
+    on when it has `batch_size` records, or its first record has waited
+    `batch_wait` seconds. With `columnar`, the batch is a dict of lists,
+    see `to_columns()`.
+
+    Messages compressed by a `Remote` (see the `codec` module) are
+    detected and unpacked; give the server any shared `dictionaries`
+    that senders compress with.
+    """
+
+    def __init__(self, cb, host, port=DEFAULT_PORT, json=True, text=False,
+                 serializer=None, workers=0, processes=False,
+                 queue_size=1000, ordered=False, batch_cb=None,
+                 batch_size=1000, batch_wait=0.1, columnar=False,
+                 dictionaries=()):
+        """Create new server.
+
+        Args:
+            cb (function): Called with each received record.
+                           Ignored, and may be None, if `batch_cb` is given.
+            host (str): Listen address, or ZeroMQ endpoint such as
+                        'ipc:///tmp/logs.sock' or 'inproc://logs'
+            port (int): Listen port, if `host` is an address
+            json (bool): If true, records are JSON
+            text (bool): If true (and not JSON), records are text
+            serializer (str|object): JSON backend name or instance,
+                                     see `serialize.get_json()`
+            workers (int): Number of workers; if 0, decode and call
+                           back in the receiving thread
+            processes (bool): If true, workers are processes instead of
+                              threads. The callback runs in the worker
+                              processes, so it must not rely on changes
+                              to state in this process.
+            queue_size (int): Max. number of messages queued for workers
+            ordered (bool): If true, keep order of records per sender
+                            (for inproc, all records go to one worker)
+            batch_cb (function): If given, called with lists of records
+            batch_size (int): Max. records per batch
+            batch_wait (float): Max. seconds to wait to fill a batch
+            columnar (bool): If true, batches are dicts of lists
+            dictionaries (list): Shared dictionaries for compressed
+                                 messages, see `codec.Decompressor`
+        """
+        url = shared.endpoint(host, port)
         _log.event('i', 'server.connect', url=url)
-        self.ctx = zmq.Context()
+        # inproc needs the context shared with Remote; otherwise, a context
+        # of its own is terminated on close, which releases the address
+        # before returning (closing the socket alone does not wait)
+        self._own_ctx = not url.startswith('inproc:')
+        self.ctx = zmq.Context() if self._own_ctx else shared.zmq_context()
         self.socket = self.ctx.socket(zmq.PULL)
         self.socket.bind(url)
-        if json:
-            self._recv = self.socket.recv_json
-        elif text:
-            self._recv = self.socket.recv_string
-        else:
-            self._recv = self.socket.recv_pyobj
+        # inproc has no peer addresses, so with `ordered` one worker gets all
+        self._by_peer = not url.startswith('inproc:')
+        self._decode = record_decoder(json, text, serializer)
+        self._unpack = Decompressor(dictionaries).unpack
         self.cb = cb
+        self.workers, self.processes = workers, processes
+        self.queue_size, self.ordered = queue_size, ordered
+        self.batch_cb, self.columnar = batch_cb, columnar
+        self.batch_size, self.batch_wait = batch_size, batch_wait
         self._done, self._done_mtx = False, threading.Lock()
         self.thread = None
+        self._queues, self._workers, self._stats = [], [], []
+
+    def stats(self):
+        """Counts for each worker.
+
+        Returns:
+            (list) One dict per worker, with keys `messages` (batches,
+                   with `batch_cb`), `records` and `errors`.
+                   Empty if there are no workers.
+        """
+        return [dict(zip(('messages', 'records', 'errors'), st))
+                for st in self._stats]
 
     def start(self):
         """Start running server in a thread."""
@@ -45,11 +192,24 @@ class Server(object):
         Return:
             True if thread is/was stopped, False otherwise
         """
-        if self.thread is None or self.is_done():
+        if self.thread is None:
             return True
         self.is_done(True)
         self.thread.join(timeout)
-        self.thread = None
+        stopped = not self.thread.is_alive()
+        if stopped:
+            self.thread = None
+            self.close()
+        return stopped
+
+    def close(self):
+        """Close the socket, releasing its address at once.
+        The shared context, used for inproc, is left open.
+        """
+        if not self.socket.closed:
+            self.socket.close(linger=0)
+            if self._own_ctx:
+                self.ctx.term()
 
     def is_done(self, value=None):
         """Thread-safe boolean attribute, to stop the loop."""
@@ -60,9 +220,103 @@ class Server(object):
         return d
 
     def run(self):
+        if self.workers > 0:
+            self._start_workers()
+        try:
+            self._receive()
+        finally:
+            self.close()
+            if self.workers > 0:
+                self._stop_workers()
+
+    def _receive(self):
+        """Receive loop. Reads all waiting messages, without blocking,
+        into one batch per destination (worker queue, or this thread)
+        and passes them on when they are full or old enough.
+        Without `batch_cb`, the batch size is one message.
+        """
+        sock, route = self.socket, len(self._queues) > 1 and self._by_peer
+        batches = [[] for _ in range(max(len(self._queues), 1))]
+        size = 1 if self.batch_cb is None else self.batch_size
+        n, t_first = 0, None
         while True:  # repeat/until loop
-            if self.socket.poll(100):
-                self.cb(self._recv())
-            if self.is_done():
+            timeout = 100
+            if t_first is not None:
+                timeout = max(int((t_first + self.batch_wait - time.time())
+                                  * 1000), 0)
+            if sock.poll(timeout):
+                while n < size:
+                    try:
+                        if route:  # by sender address
+                            msg = sock.recv_multipart(zmq.NOBLOCK, copy=False)
+                            i = hash(msg[0].get('Peer-Address')) % len(batches)
+                            frames = [f.bytes for f in msg]
+                        else:
+                            i, frames = 0, sock.recv_multipart(zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    batches[i].extend(frames)
+                    n += len(frames)
+                    if t_first is None:
+                        t_first = time.time()
+            done = self.is_done()
+            if n > 0 and (n >= size or done or
+                          time.time() - t_first >= self.batch_wait):
+                for i, frames in enumerate(batches):
+                    if frames:
+                        self._dispatch(i, frames)
+                        batches[i] = []
+                n, t_first = 0, None
+            if done:
                 break
 
+    def _dispatch(self, i, frames):
+        """Pass on a batch of messages to worker queue `i`,
+        or decode them and call back here if there are no workers.
+        """
+        if self._queues:
+            self._queues[i].put(frames)
+            return
+        try:
+            frames = self._unpack(frames)
+        except Exception as err:
+            _log.event('e', 'server.decode.error', msg=str(err))
+            return
+        if self.batch_cb is not None:
+            records = [self._decode(data) for data in frames]
+            self.batch_cb(to_columns(records) if self.columnar else records)
+        else:
+            for data in frames:
+                self.cb(self._decode(data))
+
+    def _start_workers(self):
+        """Create queues and start workers.
+        With `ordered`, each worker has its own queue; otherwise they share.
+        """
+        if self.processes:
+            import multiprocessing
+            new_queue, new_worker = multiprocessing.Queue, multiprocessing.Process
+            new_stats = lambda: multiprocessing.Array('l', 3, lock=False)
+        else:
+            new_queue, new_worker = queue.Queue, threading.Thread
+            new_stats = lambda: [0, 0, 0]
+        n_queues = self.workers if self.ordered else 1
+        size = max(self.queue_size // n_queues, 1)
+        self._queues = [new_queue(size) for _ in range(n_queues)]
+        self._stats = [new_stats() for _ in range(self.workers)]
+        self._workers = []
+        for i in range(self.workers):
+            args = (self._queues[i % n_queues], self._unpack, self._decode,
+                    self.cb, self.batch_cb, self.columnar, self._stats[i])
+            w = new_worker(target=_work, args=args)
+            w.daemon = True
+            w.start()
+            self._workers.append(w)
+
+    def _stop_workers(self):
+        """Tell workers to finish queued messages and exit; wait for them."""
+        for i in range(self.workers):
+            self._queues[i % len(self._queues)].put(None)
+        for w in self._workers:
+            w.join()
+
@@ -9,19 +9,32 @@ Design goals are minimal code, maximum flexibility, useful functionality.
 See package README.md for usage examples.
 """
 
+from array import array
+import atexit
 from datetime import datetime
-import json
+import gzip
+import io
+import math
+import os
 from six.moves import cPickle as pickle
 from collections import deque
+from six.moves import queue
 import re
 import six
+from six.moves import builtins
+import shutil
+import string
 import sys
 import syslog
+import tempfile
 import threading
 import time
 import types
+import warnings
+import weakref
 import zmq
 from semilog import const # import Keys, Severity, MAX_SEVERITY, DEFAULT_PORT
+from semilog import codec, serialize, shared, store
 
 class Subject(object):
     """Subject role in the observer pattern.
@@ -32,26 +45,51 @@ class Subject(object):
     So, e.g., `event('i', 'foo')` can be also written as `info('foo')`.
 
     All observers attached to a subject will be asked to `accept()` each event and,
-    if that returns true, receive it through `event()`.
+    if that returns true, receive it through `event()`. The same mapping
+    is passed to all observers, so it must not be modified; observers that
+    do modify it must set `mutates_event` to True, to get their own copy.
+
+    Values that are expensive to compute can be wrapped in `Lazy`; they
+    are computed once, after some observer has accepted the event.
+
+    For observers that use the default `Observer.accept()`, the subject
+    keeps an index from severity to accepting observers, so events that no
+    observer accepts cost almost nothing. The index is rebuilt when
+    `observers` is changed; call `reindex()` after changing the severity
+    or filters of an observer that is already attached.
     """
     default_fmt = "{level} {isotime} {event}: {kvp}"
     default_config = None # user can provide a default
     MAX_STORED = 100  # max. num events buffered async.
+    OVERFLOW = const.Overflow.drop_oldest  # what to do when buffer is full
+    BATCH_SIZE = 100  # max. num events sent per wakeup of async. thread
+    lazy_callables = False  # if True, all callable values are lazy
 
-    def __init__(self, config=None, async=False):
+    def __init__(self, config=None, async=False, overflow=None,
+                 max_stored=None, spill_file=None):
         """Create new instance.
 
         Args:
             config (dict): Configuration (see `configure()` method)
             async (bool): If true, send events from a separate thread to
                           avoid blocking the caller.
+            overflow (str): For async, policy when the queue is full;
+                            one of the values in `const.Overflow`.
+                            Default is `self.OVERFLOW`.
+            max_stored (int): For async, max. number of queued events.
+                              Default is `self.MAX_STORED`.
+            spill_file (str): For the 'spill' overflow policy, path of file
+                              to spill to. Default is an anonymous temp. file.
         """
+        self._index = {}
         self.observers = {}
         self.configure(config)
         self._add_sugar()
         if async:
             # init for async. sending thread
-            self._q = deque(maxlen=self.MAX_STORED)
+            self._q = EventQueue(max_stored or self.MAX_STORED,
+                                 overflow=overflow or self.OVERFLOW,
+                                 spill_file=spill_file)
             self._thr = threading.Thread(target=self._send_events, daemon=True)
             self._thr.start()
         else:
@@ -87,6 +125,47 @@ class Subject(object):
                     obs = eval(obs)
                 self.observers[obs_name] = obs
 
+    @property
+    def observers(self):
+        """Mapping of names to observers."""
+        return self._observers
+
+    @observers.setter
+    def observers(self, value):
+        self._observers = ObserverDict(self.reindex, value)
+        self.reindex()
+
+    def reindex(self):
+        """Clear the index of observers by severity.
+        It is rebuilt, one severity at a time, as events arrive.
+        """
+        self._index = {}
+
+    def _index_severity(self, sev):
+        """Find, and remember, observers interested in a severity.
+
+        Returns:
+            (list) Tuples of `(name, observer, check, copy)`, where `check`
+                   is True if `accept()` must be called for each event
+                   (it is overridden, or there are filters),
+                   and `copy` is True if the observer mutates events.
+        """
+        index = self._index  # may be replaced by reindex() meanwhile
+        level = const.Severity.get(sev, const.MAX_SEVERITY)
+        base_accept = six.get_unbound_function(Observer.accept)
+        targets = []
+        for obs_name, obs in list(self._observers.items()):
+            copy = getattr(obs, 'mutates_event', False)
+            accept = getattr(type(obs), 'accept', None)
+            if accept is not None and \
+                    six.get_unbound_function(accept) is base_accept:
+                if level <= obs.accept_severity:
+                    targets.append((obs_name, obs, bool(obs.filters), copy))
+            else:
+                targets.append((obs_name, obs, True, copy))
+        index[sev] = targets
+        return targets
+
     def event(self, severity, name, values=None, **mapping):
         """Log an event with this subject.
 
@@ -102,20 +181,52 @@ class Subject(object):
             values (dict): Optional dictionary of key/value pairs
             mapping (dict): Other key/value pairs for event
         """
+        sev = severity[0].upper()
+        targets = self._index.get(sev, None)
+        if targets is None:
+            targets = self._index_severity(sev)
+        if not targets:
+            return
         K = const.Keys
         t = time.time()
         if values:
             mapping.update(values)
         mapping[K.ts] = t
         mapping[K.event] = name
-        mapping[K.lvl] = severity[0].upper()
-        for name, obs in self.observers.items():
-            if obs.accept(mapping):
-                mcopy = mapping.copy()  # allows observer to muck w/mapping
+        mapping[K.lvl] = sev
+        # look for lazy values only if there may be some
+        resolved = not (Lazy.used or self.lazy_callables)
+        for obs_name, obs, check, copy in targets:
+            if not check or obs.accept(mapping):
+                if not resolved:
+                    self._resolve(mapping)
+                    resolved = True
+                m = mapping.copy() if copy else mapping
                 if self._q is not None:
-                    self._q.append((obs, mcopy))
+                    self._q.put((obs_name, m))
                 else:
-                    obs.event(mcopy)
+                    obs.event(m)
+
+    def _resolve(self, mapping):
+        """Replace lazy values in an event with their results."""
+        lazy_callables = self.lazy_callables
+        for k, v in mapping.items():
+            if type(v) is Lazy or (lazy_callables and callable(v)):
+                try:
+                    mapping[k] = v()
+                except Exception as err:
+                    mapping[k] = '<error: {}>'.format(err)
+
+    def enabled_for(self, severity):
+        """Whether any observer may accept events with this severity.
+
+        Use this to skip work that is only needed to log an event.
+        """
+        sev = severity[0].upper()
+        targets = self._index.get(sev, None)
+        if targets is None:
+            targets = self._index_severity(sev)
+        return bool(targets)
 
     def qlen(self):
         """Number of queued messages."""
@@ -123,39 +234,266 @@ class Subject(object):
             return 0
         return len(self._q)
 
+    def qstats(self):
+        """Counters for the async. queue.
+
+        Returns:
+            (dict) See `EventQueue.stats()`. Empty if not async.
+        """
+        if self._q is None:
+            return {}
+        return self._q.stats()
+
     def drain(self, timeout=10):
         """Wait for queue to drain.
 
         Args:
             timeout (float): Timeout in seconds
+        Return:
+            True if drained, False on timeout
         """
-        t = time.time()
-        while self.qlen() > 0:
-            time.sleep(0.1)
-            if time.time() - t > timeout:
-                return False
-        return True
+        if self._q is None:
+            return True
+        return self._q.join(timeout)
 
     def _send_events(self):
         """Send events from queue forever.
         Intended to run in a separate thread.
+
+        Events are taken from the queue in batches, and each observer
+        gets its share of a batch in a single call to `events()`.
+        Errors from an observer are logged, and its share is skipped.
         """
+        q = self._q
         while True:
-            while len(self._q) > 0:
-                obs, mapping = self._q[0]
-                obs.event(mapping)
-                # only pop after event, so empty queue means truly finished
-                self._q.popleft()
-            time.sleep(0.1)  # pause for new data
+            batch = q.get(self.BATCH_SIZE)
+            try:
+                by_obs = {}
+                for obs_name, mapping in batch:
+                    by_obs.setdefault(obs_name, []).append(mapping)
+                for obs_name, mappings in by_obs.items():
+                    obs = self.observers.get(obs_name, None)
+                    if obs is None:
+                        continue
+                    try:
+                        obs.events(mappings)
+                    except Exception as err:
+                        log = shared.registry.get('internal', NullSubject())
+                        log.event('e', 'subject.send.error',
+                                  observer=obs_name, msg=str(err))
+            finally:
+                # only mark done after events, so empty queue means finished
+                q.done()
 
     def _add_sugar(self):
         """Add syntax sugar methods, one for each const.Levelname, to Subject."""
         for sev, lvl in const.Levelname.items():
             def sugar(self, n, d=None, __sev=sev, **m):
-                self.event(__sev, n, values=d, **m)
+                # skip the call if known that no observer wants it
+                if self._index.get(__sev, True):
+                    self.event(__sev, n, values=d, **m)
             setattr(self, lvl.lower(), types.MethodType(sugar, self))
 
 
+class Lazy(object):
+    """Value of an event that is computed only if an observer accepts the
+    event, and then only once for all observers. For example:
+
+        log.debug('request', state=Lazy(lambda: json.dumps(req.state)))
+
+    Observer `accept()` methods see the `Lazy` instance, not the value.
+    If a subject's `lazy_callables` is True, any callable value is treated
+    as lazy, without this wrapper. If computing the value raises an
+    exception, the value is a string with the error.
+    """
+    __slots__ = ('fn',)
+    used = False  # set when first created, so subjects can skip the search
+
+    def __init__(self, fn):
+        """Create new lazy value.
+
+        Args:
+            fn (function): Called with no arguments to get the value
+        """
+        self.fn = fn
+        Lazy.used = True
+
+    def __call__(self):
+        return self.fn()
+
+
+class ObserverDict(dict):
+    """Dictionary of observers that calls a function whenever it changes.
+    Used by `Subject` to keep its severity index up to date.
+    """
+
+    def __init__(self, on_change, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._on_change = on_change
+
+    def _notify(method):
+        def modify(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            self._on_change()
+            return result
+        modify.__name__ = method.__name__
+        return modify
+
+    __setitem__ = _notify(dict.__setitem__)
+    __delitem__ = _notify(dict.__delitem__)
+    clear = _notify(dict.clear)
+    pop = _notify(dict.pop)
+    popitem = _notify(dict.popitem)
+    setdefault = _notify(dict.setdefault)
+    update = _notify(dict.update)
+    del _notify
+
+
+class EventQueue(object):
+    """Bounded queue of events for the async. Subject sending thread.
+
+    Items are `(observer_name, mapping)` tuples. What happens when the
+    queue is full is determined by the overflow policy, one of the values
+    in `const.Overflow`:
+
+      - block: `put()` waits until there is room
+      - drop-newest: the new item is discarded
+      - drop-oldest: the oldest queued item is discarded
+      - spill: items are pickled to a file, and read back once the
+        in-memory queue is empty. Order is preserved. Items that cannot
+        be pickled are dropped.
+    """
+
+    def __init__(self, maxlen, overflow=const.Overflow.drop_oldest,
+                 spill_file=None):
+        """Create new queue.
+
+        Args:
+            maxlen (int): Max. number of items kept in memory
+            overflow (str): Overflow policy (see class docs)
+            spill_file (str): Path for 'spill' policy; if None, use a
+                              temporary file.
+        """
+        if overflow not in const.Overflow.all:
+            raise ValueError('overflow policy "{}" not in: {}'.format(
+                overflow, ', '.join(const.Overflow.all)))
+        self.maxlen = max(maxlen, 1)
+        self.overflow = overflow
+        self._spill_path = spill_file
+        self._spill, self._spill_n, self._spill_pos = None, 0, 0
+        self._q = deque()
+        self._busy = 0
+        self._cond = threading.Condition()
+        self.n_dropped, self.n_spilled, self.n_blocked = 0, 0, 0
+
+    def __len__(self):
+        return len(self._q) + self._spill_n
+
+    def stats(self):
+        """Queue counters.
+
+        Returns:
+            (dict) Keys are `queued` (in memory), `spill_queued` (on disk),
+                   `dropped`, `spilled` and `blocked` (totals for policies).
+        """
+        with self._cond:
+            return {'queued': len(self._q), 'spill_queued': self._spill_n,
+                    'dropped': self.n_dropped, 'spilled': self.n_spilled,
+                    'blocked': self.n_blocked}
+
+    def put(self, item):
+        """Add an item, applying the overflow policy if full."""
+        P = const.Overflow
+        with self._cond:
+            if self._spill_n > 0:
+                # keep order: once spilling, stay on disk until read back
+                self._spill_write(item)
+            elif len(self._q) < self.maxlen:
+                self._q.append(item)
+            elif self.overflow == P.drop_oldest:
+                self._q.popleft()
+                self._q.append(item)
+                self.n_dropped += 1
+            elif self.overflow == P.drop_newest:
+                self.n_dropped += 1
+                return
+            elif self.overflow == P.block:
+                self.n_blocked += 1
+                while len(self._q) >= self.maxlen:
+                    self._cond.wait()
+                self._q.append(item)
+            else:
+                self._spill_write(item)
+            self._cond.notify_all()
+
+    def get(self, n):
+        """Remove and return a batch of up to `n` items.
+        Waits for items, if there are none.
+        Caller must call `done()` after processing the batch.
+        """
+        with self._cond:
+            while not self._q and self._spill_n == 0:
+                self._cond.wait()
+            if not self._q:
+                self._spill_read(n)
+            batch = [self._q.popleft() for _ in range(min(n, len(self._q)))]
+            self._busy += 1
+            self._cond.notify_all()
+        return batch
+
+    def done(self):
+        """Mark a batch from `get()` as processed."""
+        with self._cond:
+            self._busy -= 1
+            self._cond.notify_all()
+
+    def join(self, timeout):
+        """Wait until all items are processed.
+
+        Args:
+            timeout (float): Timeout in seconds
+        Return:
+            True if empty, False on timeout
+        """
+        t1 = time.time() + timeout
+        with self._cond:
+            while self._q or self._spill_n or self._busy:
+                remaining = t1 - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _spill_write(self, item):
+        try:
+            data = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+        except Exception:  # not picklable
+            self.n_dropped += 1
+            return
+        if self._spill is None:
+            if self._spill_path is None:
+                self._spill = tempfile.TemporaryFile()
+            else:
+                self._spill = open(self._spill_path, 'w+b')
+        self._spill.seek(0, 2)
+        self._spill.write(data)
+        self._spill_n += 1
+        self.n_spilled += 1
+
+    def _spill_read(self, n):
+        f = self._spill
+        f.seek(self._spill_pos)
+        for _ in range(min(n, self._spill_n)):
+            self._q.append(pickle.load(f))
+            self._spill_n -= 1
+        if self._spill_n == 0:
+            f.seek(0)
+            f.truncate()
+            self._spill_pos = 0
+        else:
+            self._spill_pos = f.tell()
+
+
 class NullSubject(object):
     """Subject that does nothing."""
     def __init__(self, **kw):
@@ -164,29 +502,109 @@ class NullSubject(object):
     def event(self, *args, **kw):
         pass
 
+def severity_level(severity):
+    """Numeric level for a severity letter-code, or integer level."""
+    if isinstance(severity, int):
+        return max(severity, 0)
+    return const.Severity[severity.upper()]
+
 class Observer(object):
     """Base class for observer role in the observer pattern.
 
+    The event mapping passed to `accept()` and `event()` is shared with
+    the other observers of the subject, and must be treated as read-only.
+    Subclasses that need to modify it should set `mutates_event` to True.
+
     See also: `Subject` class
     """
 
     default_severity = 'I'  # of accepted events
+    mutates_event = False  # if True, subject passes a copy of each event
+    filters = ()  # see `semilog.filters`
 
-    def __init__(self, severity=default_severity):
-        if isinstance(severity, int):
-            self.accept_severity = max(severity, 0)
-        else:
-            self.accept_severity = const.Severity[severity.upper()]
+    def __init__(self, severity=default_severity, filters=None):
+        """Create new observer.
+
+        Args:
+            severity (str|int): Accept events at this severity, or worse
+            filters (list): Filters, from `semilog.filters`, that
+                            accepted events must also pass, in order
+        """
+        self.accept_severity = severity_level(severity)
+        if filters:
+            self.filters = list(filters)
 
     def accept(self, mapping):
         s = mapping[const.Keys.severity]
-        return const.Severity.get(s, const.MAX_SEVERITY) <= self.accept_severity
+        if const.Severity.get(s, const.MAX_SEVERITY) > self.accept_severity:
+            return False
+        for f in self.filters:
+            if not f(mapping):
+                return False
+        return True
 
     def event(self, mapping):
         pass
 
+    def events(self, mappings):
+        """Receive a batch of accepted events, from an async. Subject.
+
+        Default is to call `event()` for each one.
+        """
+        for mapping in mappings:
+            self.event(mapping)
+
+class IsoTime(object):
+    """Render timestamps as ISO8601 date and time strings.
+
+    Output for local time is the same as
+    `datetime.fromtimestamp(ts).isoformat()`; UTC times have a 'Z' suffix.
+    The text up to the whole second is cached and reused for
+    timestamps in the same second, so only the fraction is formatted.
+    Each second is converted on its own, so DST changes are handled.
+    """
+
+    def __init__(self, utc=False):
+        """Create new renderer.
+
+        Args:
+            utc (bool): If true, use UTC instead of local time
+        """
+        self.utc = utc
+        self._from_ts = datetime.utcfromtimestamp if utc else datetime.fromtimestamp
+        self._suffix = 'Z' if utc else ''
+        self._cached = (None, None)  # (second, prefix)
+
+    def __call__(self, ts):
+        sec, prefix = self._cached
+        if sec is not None:
+            us = round((ts - sec) * 1e6)
+            if 0 < us < 1000000:
+                return '%s.%06d%s' % (prefix, us, self._suffix)
+        # split and round like datetime.fromtimestamp()
+        frac, sec = math.modf(ts)
+        us = round(frac * 1e6)
+        if us >= 1000000:
+            sec, us = sec + 1, us - 1000000
+        elif us < 0:
+            sec, us = sec - 1, us + 1000000
+        if sec != self._cached[0]:
+            prefix = self._from_ts(sec).isoformat()
+            self._cached = (sec, prefix)
+        else:
+            prefix = self._cached[1]
+        if us:
+            return '%s.%06d%s' % (prefix, us, self._suffix)
+        return prefix + self._suffix
+
+
 class TextFormatter(object):
     """Format an event as text.
+
+    The format string is compiled once, in the constructor, into a
+    list of literal text and field segments that are joined for each event.
+    Format strings that use attribute or index access, nested fields, or
+    positional fields are handled by `str.format()` instead.
     """
 
     derived_values = ['isotime', 'level']
@@ -194,60 +612,250 @@ class TextFormatter(object):
     KVP_SEP, KV_SEP = ' ', '='
     SEV_NAMES = const.Levelname
 
-    def __init__(self, format_str):
+    utc = False  # if True, isotime is in UTC instead of local time
+
+    _conversions = {'r': repr, 's': str, 'a': getattr(builtins, 'ascii', repr)}
+
+    def __init__(self, format_str, utc=None):
         """Create new formatter.
 
         Args:
            format_str (str): Format string, using '{keyword}'-style placeholders.
+           utc (bool): If not None, override `self.utc`
         """
         self.format_str = format_str
+        self._isotime = IsoTime(self.utc if utc is None else utc)
         self.derivations = {}
         self.fields = set(re.findall("\{(\w.*?)\}", format_str))
         for dv in self.derived_values:
             if dv in self.fields:
                 self.derivations[dv] = getattr(self, 'format_' + dv)
+        self._derive = list(self.derivations.items())
+        # hooks from subclasses may fill in the mapping, as they used to,
+        # so they are given a copy of it
+        self._copy = any(
+            six.get_unbound_function(getattr(type(self), 'format_' + dv)) is
+            not TextFormatter.__dict__.get('format_' + dv)
+            for dv in self.derivations)
+        # keys left out of kvp: in format, or shadowed by a derived value
+        self._hidden = self.fields.union(
+            [self.derived_shadow[key] for key in self.derivations
+             if key in self.derived_shadow])
         self._kvp = 'kvp' in self.fields
+        # subclasses that still override the deprecated add_kvp()
+        self._add_kvp = six.get_unbound_function(type(self).add_kvp) is not \
+            six.get_unbound_function(TextFormatter.add_kvp)
+        if self._add_kvp:
+            warnings.warn('TextFormatter.add_kvp() is deprecated; '
+                          'override kvp_string() instead',
+                          DeprecationWarning, stacklevel=2)
+        self._plan = self._compile(format_str)
 
-    def add_kvp(self, m):
-        """Add key-value pairs to mapping."""
-        pairs = []
+    def _compile(self, format_str):
+        """Compile format string to list of segments.
+
+        Returns:
+            List of `(literal, key, format_spec, conversion)`, where `key`
+            is None for trailing literal text; or None if the format string
+            must be rendered by `str.format()`.
+        """
+        plan = []
+        for literal, key, spec, conv in string.Formatter().parse(format_str):
+            if key is None:
+                plan.append((literal, None, None, None))
+                continue
+            if not re.match(r'[^\W\d]\w*$', key, re.UNICODE) or '{' in spec:
+                return None
+            plan.append((literal, key, spec,
+                         self._conversions[conv] if conv else None))
+        return plan
+
+    def kvp_string(self, m):
+        """Key-value pairs of mapping, as a string.
+
+        Keys that are used in the format string, or that are shadowed
+        by a derived value in the format string, are skipped.
+        """
+        fields, kv_sep = self._hidden, self.KV_SEP
+        K_ts, K_lvl = const.Keys.ts, const.Keys.lvl
+        parts = []
         for k, v in m.items():
-            if k not in self.fields:
-                if k == const.Keys.ts:
-                    v = '{:.6f}'.format(v)
-                elif k == const.Keys.lvl:
-                    v = self.SEV_NAMES[v]
-                if isinstance(v, six.string_types):
-                    if ' ' in v or '\t' in v:
-                        v = '"' + v.replace('"', '\\"') + '"'
-                pairs.append((k, v))
-        m['kvp'] = self.KVP_SEP.join(['{}{}{}'.format(k, self.KV_SEP, v)
-                                      for k, v in pairs])
+            if k in fields:
+                continue
+            if k == K_ts:
+                v = '{:.6f}'.format(v)
+            elif k == K_lvl:
+                v = self.SEV_NAMES[v]
+            if isinstance(v, six.string_types):
+                if ' ' in v or '\t' in v:
+                    v = '"' + v.replace('"', '\\"') + '"'
+                if type(v) is not str:
+                    v = format(v, '')
+            else:
+                v = format(v, '')
+            if type(k) is not str:
+                k = format(k, '')
+            parts.append(k + kv_sep + v)
+        return self.KVP_SEP.join(parts)
+
+    def add_kvp(self, m):
+        """Add key-value pairs to mapping, as 'kvp'.
+
+        Deprecated: use `kvp_string()`, which does not modify the mapping.
+        """
+        warnings.warn('TextFormatter.add_kvp() is deprecated; '
+                      'use kvp_string()', DeprecationWarning, stacklevel=2)
+        m['kvp'] = self.kvp_string(m)
 
     def format_event(self, mapping):
-        for key, func in self.derivations.items():
-            func(mapping)
-            if key in self.derived_shadow:  # remove 'shadowed' value
-                del mapping[self.derived_shadow[key]]
+        """Format an event, without modifying its mapping.
+
+        Derived values (see `derived_values`) are computed by calling the
+        `format_<name>(mapping)` method, which returns the value.
+        Deprecated: a method that instead sets `mapping[<name>]` and
+        returns None still works; methods defined in subclasses are
+        called with a copy of the mapping.
+        """
+        values = {}
+        if self._copy:
+            mapping = dict(mapping)
+        for key, func in self._derive:
+            v = func(mapping)
+            if v is None and key in mapping:  # old-style, filled in mapping
+                warnings.warn('TextFormatter.format_{}() should return the '
+                              'value instead of setting it'.format(key),
+                              DeprecationWarning, stacklevel=2)
+                v = mapping[key]
+            values[key] = v
         if self._kvp:
-            self.add_kvp(mapping)
-        return self.format_str.format(**mapping)
+            if self._add_kvp:  # deprecated override, give it a copy
+                m = dict(mapping)
+                self.add_kvp(m)
+                values['kvp'] = m['kvp']
+            else:
+                values['kvp'] = self.kvp_string(mapping)
+        if self._plan is None:
+            return self.format_str.format(**dict(mapping, **values))
+        parts = []
+        for literal, key, spec, conv in self._plan:
+            if literal:
+                parts.append(literal)
+            if key is not None:
+                v = values[key] if key in values else mapping[key]
+                if conv is not None:
+                    v = conv(v)
+                if spec or type(v) is not str:
+                    v = format(v, spec)
+                parts.append(v)
+        return ''.join(parts)
 
     def format_isotime(self, m):
-        m['isotime'] = datetime.fromtimestamp(m[const.Keys.ts]).isoformat()
+        """ISO 8601 timestamp of event."""
+        return self._isotime(m[const.Keys.ts])
 
     def format_level(self, m):
-        m['level'] = self.SEV_NAMES[m[const.Keys.lvl]]
+        """Severity name of event."""
+        return self.SEV_NAMES[m[const.Keys.lvl]]
+
+
+class _Buffer(object):
+    """Serialized events collected by `Stream` and `Remote`, and passed on
+    together, as a list, when any of the given conditions is met.
+    """
+
+    def __init__(self, write, max_events=None, max_bytes=None,
+                 interval=None, severity=None):
+        """Create new buffer.
+
+        Args:
+            write (function): Called with the list of collected data,
+                              holding the buffer's lock
+            max_events (int): Pass on every this many events
+            max_bytes (int): Pass on when this much data is collected
+            interval (float): Pass on at this interval, in seconds
+            severity (str|int): Pass on right away for events with this
+                                severity, or worse
+        """
+        self._write = write
+        self.max_events, self.max_bytes = max_events, max_bytes
+        self.level = None if severity is None else severity_level(severity)
+        self._items, self._size = [], 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        if interval:
+            thr = threading.Thread(target=_flush_periodically,
+                                   args=(interval, weakref.ref(self)),
+                                   daemon=True)
+            thr.start()
+
+    def add(self, data, severity=None):
+        """Add one serialized event, with its severity letter-code."""
+        with self._lock:
+            self._items.append(data)
+            self._size += len(data)
+            if (self.max_events and len(self._items) >= self.max_events) or \
+               (self.max_bytes and self._size >= self.max_bytes) or \
+               (self.level is not None and const.Severity.get(
+                   severity, const.MAX_SEVERITY) <= self.level):
+                self._pass_on()
+
+    def flush(self):
+        """Pass on collected events, if any."""
+        with self._lock:
+            self._pass_on()
+
+    def close(self):
+        """Pass on collected events, and stop passing on periodically."""
+        self.flush()
+        self._closed.set()
+
+    def _pass_on(self):
+        if self._items:
+            items = self._items
+            self._items, self._size = [], 0
+            self._write(items)
+
+
+def _flush_periodically(sec, ref):
+    """Call `flush()` of a buffer every `sec` seconds, until its `_closed`
+    event is set. Intended to run in a separate thread.
+    """
+    # hold only a weak reference, so the buffer can be garbage-collected
+    while True:
+        buf = ref()
+        if buf is None:
+            break
+        closed = buf._closed
+        del buf
+        if closed.wait(sec):
+            break
+        buf = ref()
+        if buf is None:
+            break
+        buf.flush()
+        del buf
 
 
 class Stream(Observer):
     """Write events as JSON or pickled objects to a stream.
+
+    JSON is serialized with the fastest library available, see
+    `semilog.serialize`. If the stream is binary, records are
+    written as UTF-8 encoded bytes.
+
+    By default, the stream is flushed after every event. If any of the
+    `flush_*` keywords are given, events are instead buffered and written,
+    then flushed, when any of the given conditions is met. Buffered events
+    are also written by `flush()`, `close()`, and at interpreter exit.
     """
 
     default_stream = sys.stderr
     json_format = True  # if False, use pickle
+    _own_stream = False  # if True, close() closes the stream
 
-    def __init__(self, fmt=None, stream=None, **kwargs):
+    def __init__(self, fmt=None, stream=None, flush_events=None,
+                 flush_bytes=None, flush_ms=None, flush_severity=None,
+                 serializer=None, **kwargs):
         """Create new stream.
 
         Default format is JSON, also available is Python pickle.
@@ -255,68 +863,818 @@ class Stream(Observer):
         Args:
             fmt (str): If not None, use format with `TextFormatter`
             stream (file): Object with `write()` method
+            flush_events (int): Flush every this many events
+            flush_bytes (int): Flush when this much data is buffered
+                               (characters, or bytes for pickle)
+            flush_ms (float): Flush buffered events at this interval
+            flush_severity (str|int): Flush immediately on events with
+                                      this severity, or worse
+            serializer (str|object): JSON backend name or instance,
+                                     see `serialize.get_json()`
             kwargs (dict): Keywords for parent class
         """
         Observer.__init__(self, **kwargs)
         self.stream = self.default_stream if stream is None else stream
+        binary = isinstance(self.stream, (io.RawIOBase, io.BufferedIOBase))
+        self._rec_sep = const.REC_SEP.encode('utf-8') if binary \
+            else const.REC_SEP
         if fmt is not None:
             self._fmt = TextFormatter(fmt)
-            self._dump = self._dump_text
+            self._dump = self._dump_text_bytes if binary else self._dump_text
         elif self.json_format:
-            self._dump = self._dump_json
+            self._json = serialize.get_json(serializer)
+            self._dump = self._dump_json_bytes if binary else self._dump_json
         else:
-            self._dump = pickle.dump
+            self._dump = self._dump_pickle
+        self._buffer = None
+        if not (flush_events is None and flush_bytes is None and
+                flush_ms is None and flush_severity is None):
+            self._empty = self._rec_sep[:0] if fmt is not None or \
+                self.json_format else b''
+            self._buffer = _Buffer(self._write_buffer, flush_events,
+                                   flush_bytes, flush_ms and flush_ms / 1000.,
+                                   flush_severity)
+            _flush_at_exit.add(self)
+
+    def _dump_text(self, mapping):
+        return self._fmt.format_event(mapping) + const.REC_SEP
+
+    def _dump_text_bytes(self, mapping):
+        return (self._fmt.format_event(mapping) + const.REC_SEP).encode('utf-8')
 
-    def _dump_text(self, mapping, stream):
-        stream.write(self._fmt.format_event(mapping) + const.REC_SEP)
+    def _dump_json(self, mapping):
+        return self._json.dumps_text(mapping) + const.REC_SEP
 
-    def _dump_json(self, mapping, stream):
-        json.dump(mapping, self.stream)
-        stream.write(const.REC_SEP)
+    def _dump_json_bytes(self, mapping):
+        return self._json.dumps(mapping) + self._rec_sep
+
+    def _dump_pickle(self, mapping):
+        return pickle.dumps(mapping)
 
     def event(self, mapping):
-        self._dump(mapping, self.stream)
+        data = self._dump(mapping)
+        if self._buffer is None:
+            self._write(data)
+            self.stream.flush()
+        else:
+            self._buffer.add(data, mapping[const.Keys.lvl])
+
+    def events(self, mappings):
+        if self._buffer is not None:
+            for mapping in mappings:
+                self.event(mapping)
+        else:
+            for mapping in mappings:
+                self._write(self._dump(mapping))
+            self.stream.flush()
+
+    def flush(self):
+        """Write any buffered events, and flush the stream."""
+        if self._buffer is not None:
+            self._buffer.flush()
+        self.stream.flush()
+
+    def close(self):
+        """Flush, and stop flushing periodically. A stream that was
+        passed in is flushed but not closed; the caller owns it.
+        """
+        if self._buffer is not None:
+            self._buffer.close()
+            _flush_at_exit.discard(self)
+        self.flush()
+        if self._own_stream:
+            self.stream.close()
+
+    def _write(self, data):
+        """Write serialized event(s) to the stream."""
+        self.stream.write(data)
+
+    def _write_buffer(self, items):
+        """Write buffered events to the stream, and flush it."""
+        self._write(self._empty.join(items))
         self.stream.flush()
 
+class RotatingFile(Stream):
+    """Write events to a file that is rotated by size and/or time.
+
+    Rotated files are renamed with a timestamp suffix, e.g.
+    `app.log.20150302-123000`, then compressed by a background thread, so
+    logging never waits for compression. Rotated files beyond the
+    retention limits are deleted after each compression.
+
+    All `Stream` keywords (format, buffering) are accepted. The file is
+    opened in binary mode, so text and JSON are written as UTF-8.
+    """
+
+    #: Compression file suffixes
+    suffixes = {'gzip': '.gz', 'zstd': '.zst'}
+    _own_stream = True
+
+    def __init__(self, path, max_bytes=None, interval=None, compress='auto',
+                 keep=None, keep_sec=None, **kwargs):
+        """Create new rotating file.
+
+        Args:
+            path (str): Path of the current file
+            max_bytes (int): Rotate when the file is at least this big
+            interval (float): Rotate at multiples of this many seconds
+                              (since the epoch), e.g. 3600 for every hour
+            compress (str): 'gzip', 'zstd', 'auto' for zstd if the
+                            `zstandard` module is installed and gzip
+                            otherwise, or None to not compress
+            keep (int): Max. number of rotated files to keep
+            keep_sec (float): Max. age of rotated files to keep
+            kwargs (dict): Keywords for `Stream`
+        """
+        if compress == 'auto':
+            try:
+                import zstandard
+                compress = 'zstd'
+            except ImportError:
+                compress = 'gzip'
+        if compress is not None and compress not in self.suffixes:
+            raise ValueError('compress "{}" not in: {}'.format(
+                compress, ', '.join(self.suffixes)))
+        self.path, self.compress = os.path.abspath(path), compress
+        self.max_bytes, self.interval = max_bytes, interval
+        self.keep, self.keep_sec = keep, keep_sec
+        self._rotated_re = re.compile(re.escape(os.path.basename(self.path)) +
+                                      r'\.\d{8}-\d{6}(-\d+)?(\.gz|\.zst)?$')
+        self._rotate_lock = threading.Lock()
+        self._compress_q = queue.Queue()
+        thr = threading.Thread(target=self._compress_files, daemon=True)
+        thr.start()
+        self._open()
+        Stream.__init__(self, stream=self._file, **kwargs)
+        # compress anything left over from before, e.g. by a crash
+        for name in self._rotated_files():
+            if not name.endswith(('.gz', '.zst')):
+                self._compress_q.put(name)
+
+    def _open(self):
+        self._file = open(self.path, 'ab')
+        self._size = self._file.tell()
+        if self.interval:
+            self._rotate_at = (math.floor(time.time() / self.interval) + 1) \
+                * self.interval
+
+    def _write(self, data):
+        with self._rotate_lock:
+            self.stream.write(data)
+            self._size += len(data)
+            if (self.max_bytes and self._size >= self.max_bytes) or \
+               (self.interval and time.time() >= self._rotate_at):
+                self._rotate()
+
+    def rotate(self):
+        """Rotate the file now."""
+        self.flush()
+        with self._rotate_lock:
+            self._rotate()
+
+    def _rotate(self):
+        """Rename current file, queue it for compression, and open a new one.
+        Caller must hold the rotation lock.
+        """
+        self._file.close()
+        base = self.path + '.' + time.strftime('%Y%m%d-%H%M%S')
+        name, i = base, 0
+        while any([os.path.exists(name + sfx) for sfx in ('', '.gz', '.zst')]):
+            i += 1
+            name = '{}-{:d}'.format(base, i)
+        os.rename(self.path, name)
+        self._open()
+        self.stream = self._file
+        self._compress_q.put(name)
+
+    def close(self, timeout=None):
+        """Flush and close the file, then wait for compression to finish.
+
+        Args:
+            timeout (float): Max. seconds to wait; if None, no limit
+        """
+        Stream.close(self)
+        t1 = None if timeout is None else time.time() + timeout
+        with self._compress_q.all_tasks_done:
+            while self._compress_q.unfinished_tasks:
+                remaining = None if t1 is None else t1 - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._compress_q.all_tasks_done.wait(remaining)
+
+    def _rotated_files(self):
+        """Paths of rotated files, oldest first."""
+        dirname = os.path.dirname(self.path)
+        paths = [os.path.join(dirname, name) for name in os.listdir(dirname)
+                 if self._rotated_re.match(name)]
+        return sorted(paths, key=os.path.getmtime)
+
+    def _compress_files(self):
+        """Compress rotated files and apply retention limits, forever.
+        Intended to run in a separate thread.
+        """
+        while True:
+            path = self._compress_q.get()
+            try:
+                if self.compress is not None:
+                    self._compress_file(path)
+                self._expire_files()
+            except (IOError, OSError) as err:
+                log = shared.registry.get('internal', NullSubject())
+                log.event('e', 'rotate.error', path=path, msg=str(err))
+            finally:
+                self._compress_q.task_done()
+
+    def _compress_file(self, path):
+        dest = path + self.suffixes[self.compress]
+        with open(path, 'rb') as src:
+            if self.compress == 'zstd':
+                import zstandard
+                with open(dest, 'wb') as dst:
+                    zstandard.ZstdCompressor().copy_stream(src, dst)
+            else:
+                with gzip.open(dest, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+        shutil.copystat(path, dest)
+        os.remove(path)
+
+    def _expire_files(self):
+        paths = self._rotated_files()
+        if self.keep is not None and len(paths) > self.keep:
+            for path in paths[:len(paths) - self.keep]:
+                os.remove(path)
+            paths = paths[len(paths) - self.keep:]
+        if self.keep_sec is not None:
+            t_min = time.time() - self.keep_sec
+            for path in paths:
+                if os.path.getmtime(path) < t_min:
+                    os.remove(path)
+
+
+# buffered observers, to flush at exit
+_flush_at_exit = weakref.WeakSet()
+
+@atexit.register
+def _flush_observers():
+    for obs in list(_flush_at_exit):
+        try:
+            obs.flush()
+        except (IOError, ValueError, zmq.ZMQError):
+            pass  # e.g., stream already closed
+
 class Remote(Observer):
     """Send events to a remote receiver.
+
+    By default, each event is sent as its own message. If any of the
+    `batch_*` keywords are given, events are instead collected and sent
+    as one multipart message, with one event per part, when any of the
+    given conditions is met. Collected events are also sent by `flush()`,
+    `close()`, and at interpreter exit. The `receive.Server` unpacks
+    multipart messages automatically.
+
+    ZeroMQ sockets are not thread-safe, so each thread that sends events
+    gets its own socket. A thread's socket is closed when the thread
+    exits, and all are closed by `close()`.
+    All sockets use the shared context from `shared.zmq_context()`.
+
+    Instead of a TCP host and port, `host` may be any ZeroMQ endpoint,
+    e.g. 'ipc:///tmp/logs.sock' for a collector on the same host, or
+    'inproc://logs' for a `receive.Server` in the same process.
+
+    With `store_path`, messages are stored and forwarded: a message that
+    cannot be sent right away, because the collector is down or slow, is
+    appended to a `store.Store` at that path instead of waiting in memory.
+    A background thread sends stored messages, in order, once the
+    collector can take them, and new messages go to the store until it is
+    empty. Messages still stored at exit are sent by the next `Remote` with
+    the same `store_path`. Memory use is bounded by `hwm` (messages queued
+    by ZeroMQ per socket), disk use by `store_quota`, and `stats()` has
+    the counters of the store. Messages already queued by ZeroMQ when the
+    collector goes away can still be lost, so use a small `hwm` to
+    limit them.
+
+    With `compress`, each message (one event, or a batch) is compressed
+    into a single frame, see the `codec` module. A shared `dictionary`
+    from `codec.train_dictionary()` helps most for small messages; the
+    `receive.Server` must be given the same dictionary.
     """
 
     json_format = True  # if False (and no format), use pickle
 
-    _context = None  # internal zmq state
-
-    def __init__(self, host, port=const.DEFAULT_PORT, fmt=None, **kwargs):
+    def __init__(self, host, port=const.DEFAULT_PORT, fmt=None,
+                 serializer=None, batch_events=None, batch_bytes=None,
+                 batch_ms=None, hwm=None, store_path=None,
+                 store_quota=1024 * 1024 * 1024, compress=None,
+                 compress_level=None, dictionary=None, **kwargs):
         """Create new stream.
 
         Default format is JSON, also available is Python pickle or text.
 
         Args:
-            host (str): Remote host TCP/IP address
-            port (int): Remote port
+            host (str): Remote host TCP/IP address, or ZeroMQ endpoint
+            port (int): Remote port, if `host` is an address
             fmt (str): If not None, use format with `TextFormatter`
-            stream (file): Object with `write()` method
+            serializer (str|object): JSON backend name or instance,
+                                     see `serialize.get_json()`
+            batch_events (int): Send every this many events
+            batch_bytes (int): Send when this many bytes are collected
+            batch_ms (float): Send collected events at this interval
+            hwm (int): Max. number of messages ZeroMQ queues in memory for
+                       each socket; default is ZeroMQ's (1000)
+            store_path (str): Base path of files to store messages in,
+                              for store-and-forward (see class docs)
+            store_quota (int): Max. total size of the stored messages;
+                               beyond this, the oldest ones are dropped
+            compress (str): Codec to compress messages with: 'zlib',
+                            'lz4' or 'zstd', see `codec.available()`
+            compress_level (int): Compression level; default is the codec's
+            dictionary (bytes): Shared dictionary for compression
             kwargs (dict): Keywords for parent class
         """
         Observer.__init__(self, **kwargs)
-        url = "tcp://{}:{:d}".format(host, port)
-        if self._context is None:
-            self._context = zmq.Context()
-        self.socket = self._context.socket(zmq.PUSH)
-        self.socket.connect(url)
+        self.url = shared.endpoint(host, port)
+        self.hwm = hwm
+        self._pack = None if compress is None else codec.Compressor(
+            compress, level=compress_level, dictionary=dictionary).pack
+        self._store = None if store_path is None else \
+            store.Store(store_path, quota_bytes=store_quota)
+        self._closed = threading.Event()
+        self._local = threading.local()
+        self._sockets, self._sockets_lock = {}, threading.Lock()
+        self._new_socket()  # connect now, for the creating thread
         if fmt is not None:
-            self._fmt, self._send = TextFormatter(fmt), self._send_text
+            self._fmt, self._dump = TextFormatter(fmt), self._dump_text
         elif self.json_format:
-            self._send = self.socket.send_json
+            self._json = serialize.get_json(serializer)
+            self._dump = self._json.dumps
         else:
-            self._send = self.socket.send_pyobj
+            self._dump = self._dump_pickle
+        self._buffer = None
+        if not (batch_events is None and batch_bytes is None and
+                batch_ms is None):
+            self._buffer = _Buffer(self._send_batch, batch_events,
+                                   batch_bytes, batch_ms and batch_ms / 1000.)
+        self._forwarder = None
+        if self._store is not None:
+            self._stored = threading.Event()
+            self._forwarder = threading.Thread(target=self._forward,
+                                               daemon=True)
+            self._forwarder.start()
+        if self._buffer is not None or self._store is not None:
+            _flush_at_exit.add(self)
+
+    @property
+    def socket(self):
+        """ZeroMQ socket for the calling thread."""
+        try:
+            return self._local.socket
+        except AttributeError:
+            return self._new_socket()
 
-    def _send_text(self, mapping):
+    def _new_socket(self):
+        sock = shared.zmq_context().socket(zmq.PUSH)
+        if self.hwm is not None:
+            sock.setsockopt(zmq.SNDHWM, self.hwm)
+        if self._store is not None:  # no queueing while disconnected
+            sock.setsockopt(zmq.IMMEDIATE, 1)
+        sock.connect(self.url)
+        thr = threading.current_thread()
+        with self._sockets_lock:
+            self._sockets[thr] = sock
+        self._local.socket = sock
+        self._local.closer = _SocketCloser(weakref.ref(self), thr, sock)
+        return sock
+
+    def _release(self, thr, sock):
+        """Forget and close the socket of a thread."""
+        with self._sockets_lock:
+            if self._sockets.get(thr, None) is sock:
+                del self._sockets[thr]
+        sock.close()
+
+    def _dump_text(self, mapping):
         s = self._fmt.format_event(mapping) + const.REC_SEP
-        self.socket.send_string(s)
+        return s.encode('utf-8')
+
+    def _dump_pickle(self, mapping):
+        return pickle.dumps(mapping, pickle.HIGHEST_PROTOCOL)
+
+    def event(self, mapping):
+        data = self._dump(mapping)
+        if self._buffer is not None:
+            self._buffer.add(data)
+            return
+        if self._pack is not None:
+            data = self._pack([data])
+        if self._store is None:
+            self.socket.send(data)
+        else:
+            self._send_or_store([data])
+
+    def events(self, mappings):
+        if self._buffer is not None:
+            for mapping in mappings:
+                self.event(mapping)
+        elif mappings:
+            frames = [self._dump(m) for m in mappings]
+            if self._pack is not None:
+                frames = [self._pack(frames)]
+            if self._store is None:
+                self.socket.send_multipart(frames)
+            else:
+                self._send_or_store(frames)
+
+    def flush(self):
+        """Send any collected events, and save the read position of
+        the store, if any.
+        """
+        if self._buffer is not None:
+            self._buffer.flush()
+        if self._store is not None:
+            self._store.sync()
+
+    def close(self):
+        """Send any collected events, then close the sockets.
+        Messages that are still stored stay in the store.
+        """
+        if self._buffer is not None:
+            self._buffer.close()
+        self.flush()
+        self._closed.set()
+        _flush_at_exit.discard(self)
+        if self._forwarder is not None:
+            self._stored.set()
+            self._forwarder.join()
+            self._store.close()
+        with self._sockets_lock:
+            for sock in self._sockets.values():
+                sock.close()
+            self._sockets.clear()
+        self._local = threading.local()
+
+    def _send_batch(self, frames):
+        """Send collected events, as one message."""
+        if self._pack is not None:
+            frames = [self._pack(frames)]
+        if self._store is None:
+            self.socket.send_multipart(frames)
+        else:
+            self._send_or_store(frames)
+
+    def stats(self):
+        """Counters for store-and-forward, see `store.Store.stats()`.
+
+        Returns:
+            (dict) Counters, empty if there is no store
+        """
+        return {} if self._store is None else self._store.stats()
+
+    def _send_or_store(self, frames):
+        """Send message now, or if it would have to wait, or other
+        messages are waiting in the store, append it to the store.
+        """
+        if self._store.empty:
+            try:
+                self.socket.send_multipart(frames, zmq.NOBLOCK)
+                return
+            except zmq.Again:
+                pass
+        self._store.append(frames)
+        self._stored.set()
+
+    def _forward(self):
+        """Send stored messages until closed.
+        Intended to run in a separate thread.
+        """
+        st, sock = self._store, self.socket
+        while not self._closed.is_set():
+            self._stored.clear()
+            if st.empty:
+                self._stored.wait(1)
+            elif sock.poll(200, zmq.POLLOUT):
+                frames = st.peek()
+                if frames is None:
+                    continue
+                try:
+                    sock.send_multipart(frames, zmq.NOBLOCK)
+                except zmq.Again:
+                    continue
+                st.pop()
+
+
+class _SocketCloser(object):
+    """Closes a thread's `Remote` socket when it is deleted, which happens
+    when the thread exits and its thread-local values are deleted.
+    """
+    __slots__ = ('remote', 'thread', 'socket')
+
+    def __init__(self, remote_ref, thread, socket):
+        self.remote, self.thread, self.socket = remote_ref, thread, socket
+
+    def __del__(self):
+        try:
+            remote = self.remote()
+            if remote is None:
+                self.socket.close()
+            else:
+                remote._release(self.thread, self.socket)
+        except Exception:  # e.g. at interpreter exit
+            pass
+
+
+class RingBuffer(Observer):
+    """Keep the most recent events in memory, e.g. to dump them on error.
+
+    Events are stored in fixed-size columns: timestamps, severity levels
+    and event names (as IDs in a table of names) in arrays, and the other
+    values as a tuple that shares a tuple of keys with all events that
+    have the same keys. Adding an event is O(1), and `select()` finds a time
+    range by binary search, assuming that timestamps increase.
+    The tables of names and keys are rebuilt from the stored events when
+    they reach twice `size`, so they stay bounded too.
+    """
+
+    _fixed_keys = (const.Keys.ts, const.Keys.event, const.Keys.lvl)
+
+    def __init__(self, size=1000, **kwargs):
+        """Create new buffer.
+
+        Args:
+            size (int): Number of events to keep
+            kwargs (dict): Keywords for parent class
+        """
+        Observer.__init__(self, **kwargs)
+        self.size = size
+        self._ts = array('d', [0.]) * size
+        self._level = array('B', [0]) * size
+        self._name = array('L', [0]) * size
+        self._values = [None] * size  # (keys_id, values)
+        self._names, self._name_ids = [], {}
+        self._keys, self._keys_ids = [], {}
+        self._letters = {}  # level -> severity letter-code
+        self._n = 0  # number of events added, ever
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._n, self.size)
+
+    def event(self, mapping):
+        K, fixed = const.Keys, self._fixed_keys
+        keys = tuple(mapping)
+        if keys[-3:] == fixed:  # as added by Subject.event()
+            keys = keys[:-3]
+        else:
+            keys = tuple([k for k in keys if k not in fixed])
+        values = tuple(map(mapping.__getitem__, keys))
+        name, letter = mapping[K.event], mapping[K.lvl]
+        level = min(const.Severity.get(letter, const.MAX_SEVERITY), 255)
+        with self._lock:
+            if len(self._names) >= 2 * self.size or \
+                    len(self._keys) >= 2 * self.size:
+                self._compact()
+            name_id = self._name_ids.get(name, None)
+            if name_id is None:
+                name_id = self._name_ids[name] = len(self._names)
+                self._names.append(name)
+            keys_id = self._keys_ids.get(keys, None)
+            if keys_id is None:
+                keys_id = self._keys_ids[keys] = len(self._keys)
+                self._keys.append(keys)
+            self._letters[level] = letter
+            i = self._n % self.size
+            self._ts[i] = mapping[K.ts]
+            self._level[i] = level
+            self._name[i] = name_id
+            self._values[i] = (keys_id, values)
+            self._n += 1
+
+    def select(self, start=None, end=None, severity=None, name=None):
+        """Get stored events, oldest first.
+
+        Args:
+            start (float): If given, only events at or after this time
+            end (float): If given, only events before this time
+            severity (str|int): If given, only events with this severity,
+                                or worse
+            name (str): If given, only events with this name
+        Returns:
+            (list) Event mappings
+        """
+        K = const.Keys
+        level = None if severity is None else severity_level(severity)
+        with self._lock:
+            n = len(self)
+            first = self._n - n
+            lo = 0 if start is None else self._bisect(first, n, start)
+            hi = n if end is None else self._bisect(first, n, end)
+            name_id = None
+            if name is not None:
+                name_id = self._name_ids.get(name, None)
+                if name_id is None:
+                    return []
+            result = []
+            for j in range(lo, hi):
+                i = (first + j) % self.size
+                if level is not None and self._level[i] > level:
+                    continue
+                if name_id is not None and self._name[i] != name_id:
+                    continue
+                keys_id, values = self._values[i]
+                e = dict(zip(self._keys[keys_id], values))
+                e[K.ts] = self._ts[i]
+                e[K.event] = self._names[self._name[i]]
+                e[K.lvl] = self._letters[self._level[i]]
+                result.append(e)
+        return result
+
+    def clear(self):
+        """Remove all stored events."""
+        with self._lock:
+            self._n = 0
+            self._values = [None] * self.size
+            self._names, self._name_ids = [], {}
+            self._keys, self._keys_ids = [], {}
+            self._letters = {}
+
+    def _compact(self):
+        """Rebuild the tables of names and keys from the stored events,
+        dropping entries that are no longer used. Called with lock held.
+        """
+        names, name_ids, keys, keys_ids = [], {}, [], {}
+        for i in range(len(self)):
+            name = self._names[self._name[i]]
+            name_id = name_ids.get(name, None)
+            if name_id is None:
+                name_id = name_ids[name] = len(names)
+                names.append(name)
+            self._name[i] = name_id
+            keys_id, values = self._values[i]
+            k = self._keys[keys_id]
+            keys_id = keys_ids.get(k, None)
+            if keys_id is None:
+                keys_id = keys_ids[k] = len(keys)
+                keys.append(k)
+            self._values[i] = (keys_id, values)
+        self._names, self._name_ids = names, name_ids
+        self._keys, self._keys_ids = keys, keys_ids
+
+    def _bisect(self, first, n, t):
+        """Index of the first of `n` stored events, starting at `first`,
+        with a timestamp >= `t`.
+        """
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._ts[(first + mid) % self.size] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class Channel(Observer):
+    """Hand events to a collector thread, which passes them on, in batches,
+    to other observers.
+
+    The events are not copied or serialized: the channel just appends the
+    event mapping to a `collections.deque`, which needs no lock, and wakes
+    the collector only if it is waiting. The same channel can be attached
+    to many subjects, to fan their events in to one set of observers.
+    The observers get batches of events through `events()`, filtered by
+    their `accept()`, in the collector thread.
+
+        channel = Channel([Remote(host, batch_events=500),
+                           Stream(stream=open('app.log', 'a'), flush_ms=500)],
+                          severity='D')
+        for subject in subjects:
+            subject.observers['channel'] = channel
+    """
+
+    def __init__(self, observers, batch_size=1000, max_queued=100000,
+                 linger_ms=5, **kwargs):
+        """Create new channel, and start its collector thread.
+
+        Args:
+            observers (list|dict): Observers to pass events on to
+            batch_size (int): Max. number of events per batch
+            max_queued (int): Max. number of queued events; beyond this,
+                              the oldest events are dropped (see `dropped`)
+            linger_ms (float): After passing on a partial batch, wait this
+                               long for more events, so the collector
+                               thread wakes up less often
+            kwargs (dict): Keywords for parent class
+        """
+        Observer.__init__(self, **kwargs)
+        self.observers = list(observers.values()) \
+            if hasattr(observers, 'values') else list(observers)
+        self.batch_size, self.max_queued = batch_size, max_queued
+        self.linger = linger_ms / 1000.
+        self.dropped = 0
+        self._q = deque()
+        self._idle = False
+        self._wake = threading.Event()
+        # flush() requests are numbered; the collector records the last
+        # one it has handled, and notifies `_flushed_cond`
+        self._flushes = self._flushed = 0
+        self._flushed_cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._collect, daemon=True)
+        self._thread.start()
+        _flush_at_exit.add(self)
 
     def event(self, mapping):
-        self._send(mapping)
+        q = self._q
+        if len(q) >= self.max_queued:
+            try:
+                q.popleft()
+                self.dropped += 1
+            except IndexError:  # collector took it
+                pass
+        q.append(mapping)
+        if self._idle:
+            self._wake.set()
+
+    def events(self, mappings):
+        for mapping in mappings:
+            self.event(mapping)
+
+    def flush(self, timeout=10):
+        """Wait for events queued so far to be passed on, then flush
+        the observers that have a `flush()` method.
+
+        Returns:
+            (bool) False if timed out
+        """
+        t_end = time.time() + timeout
+        with self._flushed_cond:
+            self._flushes += 1
+            n = self._flushes
+            self._wake.set()
+            while self._flushed < n:
+                remaining = t_end - time.time()
+                if remaining <= 0:
+                    return False
+                self._flushed_cond.wait(remaining)
+        for obs in self.observers:
+            if hasattr(obs, 'flush'):
+                obs.flush()
+        return True
+
+    def close(self, timeout=10):
+        """Pass on queued events, and stop the collector thread.
+        The observers are not closed.
+        """
+        self._closed = True
+        self.flush(timeout)
+        self._thread.join(timeout)
+        _flush_at_exit.discard(self)
+
+    def _collect(self):
+        """Pass on events from the queue, until closed.
+        Intended to run in a separate thread.
+        """
+        q, wake, size = self._q, self._wake, self.batch_size
+        while True:
+            self._idle = True
+            if not q and self._flushed == self._flushes:
+                if self._closed:
+                    break
+                wake.wait(0.5)
+            self._idle = False
+            wake.clear()
+            # events queued before the latest flush() are in the first `n`
+            flushes, n = self._flushes, len(q)
+            batch = []
+            while n > 0:
+                batch = []
+                try:
+                    while len(batch) < min(n, size):
+                        batch.append(q.popleft())
+                except IndexError:  # fewer, after drops
+                    n = 0
+                n -= len(batch)
+                self._pass_on(batch)
+            if flushes != self._flushed:
+                with self._flushed_cond:
+                    self._flushed = flushes
+                    self._flushed_cond.notify_all()
+            elif batch and len(batch) < size and self.linger \
+                    and not self._closed:
+                time.sleep(self.linger)  # let a bigger batch collect
+
+    def _pass_on(self, batch):
+        for obs in self.observers:
+            mappings = [m for m in batch if obs.accept(m)]
+            if not mappings:
+                continue
+            if getattr(obs, 'mutates_event', False):
+                mappings = [m.copy() for m in mappings]
+            try:
+                obs.events(mappings)
+            except Exception as err:
+                log = shared.registry.get('internal', NullSubject())
+                log.event('e', 'channel.error', observer=type(obs).__name__,
+                          msg=str(err))
 
 
 class Syslog(Observer):
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Serialize events as JSON.
+
+The standard library `json` module is always available, but if one of
+the faster JSON libraries `orjson`, `msgspec` or `ujson` is installed,
+`get_json()` will pick it instead. All serializers have the same interface:
+
+    - dumps(obj): Serialize to UTF-8 encoded bytes
+    - dumps_text(obj): Serialize to a string
+    - loads(data): Parse bytes or string
+    - decode_errors: Tuple of the exceptions `loads()` raises for bad data
+
+Values that JSON cannot represent natively are passed to a `default`
+function, like the one of the same name in `json.dumps()`.
+The default for this is `json_default()`.
+"""
+__author__ = "agent <agent@local>"
+__created__ = "2026-10-16"
+
+import datetime
+import json
+
+
+def json_default(obj):
+    """Convert values that JSON can't represent natively.
+
+    Handles dates and times, sets, bytes, and numpy scalars and arrays.
+
+    Raises:
+        TypeError: If the value can't be converted
+    """
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8', 'replace')
+    if hasattr(obj, 'tolist'):  # numpy
+        return obj.tolist()
+    raise TypeError('{!r} is not JSON serializable'.format(obj))
+
+
+class JsonSerializer(object):
+    """Serializer using the standard library `json` module.
+    """
+    name = 'json'
+    decode_errors = (ValueError,)
+
+    def __init__(self, default=json_default):
+        self.default = default
+        self._encoder = json.JSONEncoder(default=default)
+
+    def dumps(self, obj):
+        return self._encoder.encode(obj).encode('utf-8')
+
+    def dumps_text(self, obj):
+        return self._encoder.encode(obj)
+
+    def loads(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+class OrjsonSerializer(object):
+    """Serializer using the `orjson` library.
+    """
+    name = 'orjson'
+
+    def __init__(self, default=json_default):
+        import orjson
+        self.default = default
+        self._dumps, self.loads = orjson.dumps, orjson.loads
+        self.decode_errors = (orjson.JSONDecodeError, ValueError)
+        self._options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, obj):
+        return self._dumps(obj, default=self.default, option=self._options)
+
+    def dumps_text(self, obj):
+        return self.dumps(obj).decode('utf-8')
+
+
+class MsgspecSerializer(object):
+    """Serializer using the `msgspec` library.
+    """
+    name = 'msgspec'
+
+    def __init__(self, default=json_default):
+        import msgspec
+        self.default = default
+        self.dumps = msgspec.json.Encoder(enc_hook=default).encode
+        self.loads = msgspec.json.Decoder().decode
+        self.decode_errors = (msgspec.DecodeError, ValueError)
+
+    def dumps_text(self, obj):
+        return self.dumps(obj).decode('utf-8')
+
+
+class UjsonSerializer(object):
+    """Serializer using the `ujson` library.
+
+    Versions of ujson older than 2.0 have no `default` argument;
+    with those, the constructor raises TypeError.
+    """
+    name = 'ujson'
+    decode_errors = (ValueError,)
+
+    def __init__(self, default=json_default):
+        import ujson
+        ujson.dumps({}, default=str)  # TypeError if not supported
+        self.default = default
+        self._dumps, self.loads = ujson.dumps, ujson.loads
+
+    def dumps(self, obj):
+        return self.dumps_text(obj).encode('utf-8')
+
+    def dumps_text(self, obj):
+        return self._dumps(obj, default=self.default,
+                           escape_forward_slashes=False)
+
+
+#: Serializer classes, in order of preference
+BACKENDS = (OrjsonSerializer, MsgspecSerializer, UjsonSerializer,
+            JsonSerializer)
+
+
+def get_json(name=None, default=json_default):
+    """Get a JSON serializer.
+
+    Args:
+        name (str): Name of backend, e.g. 'json'. If None, use the
+                    first one from `BACKENDS` that can be imported.
+                    For convenience, this may also be a serializer
+                    instance, which is returned as-is.
+        default (function): Function to convert non-JSON values
+    Returns:
+        Serializer instance
+    Raises:
+        ValueError: Unknown backend name
+        ImportError: Backend library is not installed
+        TypeError: Backend library version is not supported
+    """
+    if hasattr(name, 'dumps'):
+        return name
+    if name is None:
+        for backend in BACKENDS:
+            try:
+                return backend(default=default)
+            except (ImportError, TypeError):
+                pass
+    for backend in BACKENDS:
+        if backend.name == name:
+            return backend(default=default)
+    raise ValueError('JSON backend "{}" not in: {}'.format(
+        name, ', '.join([b.name for b in BACKENDS])))
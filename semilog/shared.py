@@ -3,6 +3,43 @@ Code and variables shared across modules.
 
 Constants are in a separate module, `const`
 """
+import os
+import threading
+import zmq
 
 # global log registry (if you want to use it)
 registry = {}
+
+#: Number of I/O threads for the shared ZeroMQ context.
+#: Only has an effect if set before the context is first used.
+zmq_io_threads = 1
+
+_context, _context_pid = None, None
+_context_lock = threading.Lock()
+
+def zmq_context():
+    """Get the process-wide ZeroMQ context.
+
+    It is created on first use, with `zmq_io_threads` I/O threads.
+    After a fork, the child process gets a new context.
+    """
+    global _context, _context_pid
+    with _context_lock:
+        if _context is None or _context_pid != os.getpid():
+            _context = zmq.Context(io_threads=zmq_io_threads)
+            _context_pid = os.getpid()
+        return _context
+
+def endpoint(host, port):
+    """ZeroMQ endpoint for a host and port.
+
+    Args:
+        host (str): Host address, or full ZeroMQ endpoint such as
+                    'ipc:///tmp/logs.sock' or 'inproc://logs'
+        port (int): TCP port; ignored if `host` is an endpoint
+    Returns:
+        (str) Endpoint, e.g. 'tcp://127.0.0.1:9000'
+    """
+    if '://' in host:
+        return host
+    return "tcp://{}:{:d}".format(host, port)
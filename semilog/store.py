@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only message store on disk, for store-and-forward sending.
+
+A store is a series of segment files, `<path>.000000`, `<path>.000001`, ...
+Messages (lists of byte-string frames, as sent with ZeroMQ) are appended
+to the last segment, and read back in order from the first. Each message
+is one record:
+
+    length (u32)   -- of the rest of the record
+    frames         -- each one a length (u32) and the frame bytes
+
+A segment is removed once all its messages are read back, and the read
+position is saved in `<path>.pos`, so a new `Store` with the same path
+picks up where the last one stopped. The position is saved every
+`sync_every` messages and by `sync()`, so after a crash some messages may
+be read back twice, but none are lost. A partial record at the end of
+a segment, from a crash while writing, is ignored.
+
+The total size of the segments is limited by `quota_bytes`; to append
+beyond it, the oldest segments are dropped.
+"""
+__author__ = "agent <agent@local>"
+__created__ = "2026-10-16"
+
+import glob
+import os
+import re
+import struct
+import threading
+
+_LEN = struct.Struct('<I')
+
+
+def segments(path):
+    """Paths of the segments of a store, in order."""
+    pattern = re.compile(re.escape(os.path.basename(path)) + r'\.\d{6}$')
+    return sorted([p for p in glob.glob(glob.escape(path) + '.*')
+                   if pattern.match(os.path.basename(p))])
+
+def _seg_num(seg_path):
+    return int(seg_path[-6:])
+
+
+class Store(object):
+    """Append-only store of messages (see module docs).
+
+    All methods are thread-safe.
+    """
+
+    def __init__(self, path, segment_bytes=16 * 1024 * 1024,
+                 quota_bytes=1024 * 1024 * 1024, sync_every=1000):
+        """Open store, creating it if needed.
+
+        Args:
+            path (str): Base path of segment files
+            segment_bytes (int): Start a new segment after this many bytes
+            quota_bytes (int): Max. total size of segments
+            sync_every (int): Save read position every this many messages
+        """
+        self.path, self.segment_bytes = path, segment_bytes
+        self.quota_bytes, self.sync_every = quota_bytes, sync_every
+        self._lock = threading.Lock()
+        self._pos_path = path + '.pos'
+        self.n_stored, self.n_read = 0, 0
+        self.dropped_segments, self.dropped_bytes = 0, 0
+        self._wr, self._rd = None, None
+        # {segment number: size}, for all segments
+        self._sizes = dict([(_seg_num(p), os.path.getsize(p))
+                            for p in segments(path)])
+        self._rd_num, self._rd_pos = self._load_pos()
+        for num in [n for n in self._sizes if n < self._rd_num]:
+            self._remove(num)  # already read
+        if self._rd_num not in self._sizes:  # never reuse a position
+            self._rd_num = min(self._sizes) if self._sizes \
+                else self._rd_num + 1
+            self._rd_pos = 0
+        self._wr_num = max(self._sizes) + 1 if self._sizes else self._rd_num
+        self._peeked = None  # (segment number, position after record)
+        self._unsynced = 0
+
+    def __len__(self):
+        """Number of bytes of messages not read yet."""
+        with self._lock:
+            return self._queued_bytes()
+
+    @property
+    def empty(self):
+        return not self._sizes
+
+    def append(self, frames):
+        """Add a message at the end.
+
+        Args:
+            frames (list): Message frames (bytes)
+        Returns:
+            (bool) False if not stored, because it alone exceeds the quota
+        """
+        parts = []
+        for frame in frames:
+            parts.append(_LEN.pack(len(frame)))
+            parts.append(frame)
+        body = b''.join(parts)
+        record = _LEN.pack(len(body)) + body
+        with self._lock:
+            if len(record) > self.quota_bytes:
+                return False
+            while sum(self._sizes.values()) + len(record) > self.quota_bytes:
+                self._drop_oldest()
+            if self._wr is None or \
+               self._sizes[self._wr_num] >= self.segment_bytes:
+                self._next_segment()
+            self._wr.write(record)
+            self._wr.flush()
+            self._sizes[self._wr_num] += len(record)
+            self.n_stored += 1
+        return True
+
+    def peek(self):
+        """Get the first message not read yet, without removing it.
+
+        Returns:
+            (list) Frames, or None if there are none
+        """
+        with self._lock:
+            while self._sizes:
+                if self._rd_pos < self._sizes[self._rd_num]:
+                    frames = self._read_record()
+                    if frames is not None:
+                        self._peeked = (self._rd_num, self._rd.tell())
+                        return frames
+                # read to end of segment
+                if self._rd_num == self._wr_num and self._wr is not None:
+                    if self._sizes[self._rd_num] == self._rd_pos:
+                        self._reset()
+                    return None
+                self._remove(self._rd_num)
+                self._rd_num, self._rd_pos = self._first(), 0
+            return None
+
+    def pop(self):
+        """Remove the message returned by `peek()`."""
+        with self._lock:
+            if self._peeked is None or self._peeked[0] != self._rd_num:
+                return  # segment was dropped
+            self._rd_pos = self._peeked[1]
+            self._peeked = None
+            self.n_read += 1
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every:
+                self._save_pos()
+
+    def sync(self):
+        """Save the read position."""
+        with self._lock:
+            if self._unsynced:
+                self._save_pos()
+
+    def close(self):
+        """Save the read position and close the files."""
+        with self._lock:
+            self._save_pos()
+            for f in (self._wr, self._rd):
+                if f is not None:
+                    f.close()
+            self._wr, self._rd = None, None
+
+    def stats(self):
+        """Counters for the store.
+
+        Returns:
+            (dict) Keys are `stored` and `read` (numbers of messages),
+                   `queued_bytes` (not read yet), `segments` (number of
+                   segment files), and `dropped_segments` and
+                   `dropped_bytes` (for the quota)
+        """
+        with self._lock:
+            return {'stored': self.n_stored, 'read': self.n_read,
+                    'dropped_segments': self.dropped_segments,
+                    'dropped_bytes': self.dropped_bytes,
+                    'queued_bytes': self._queued_bytes(),
+                    'segments': len(self._sizes)}
+
+    # Caller holds the lock for all below
+
+    def _seg_path(self, num):
+        return '{}.{:06d}'.format(self.path, num)
+
+    def _first(self):
+        return min(self._sizes) if self._sizes else self._wr_num
+
+    def _queued_bytes(self):
+        return sum(self._sizes.values()) - (
+            self._rd_pos if self._rd_num in self._sizes else 0)
+
+    def _read_record(self):
+        """Read record at the read position, or return None if it is
+        partial. Leaves the file at the end of the record.
+        """
+        if self._rd is None or self._rd.name != self._seg_path(self._rd_num):
+            if self._rd is not None:
+                self._rd.close()
+            self._rd = open(self._seg_path(self._rd_num), 'rb')
+        f = self._rd
+        f.seek(self._rd_pos)
+        hdr = f.read(_LEN.size)
+        if len(hdr) < _LEN.size:
+            return None
+        body = f.read(_LEN.unpack(hdr)[0])
+        if len(body) < _LEN.unpack(hdr)[0]:
+            return None
+        frames, i = [], 0
+        while i < len(body):
+            n = _LEN.unpack_from(body, i)[0]
+            i += _LEN.size
+            frames.append(body[i:i + n])
+            i += n
+        return frames
+
+    def _next_segment(self):
+        if self._wr is not None:
+            self._wr.close()
+            self._wr_num += 1
+        self._wr = open(self._seg_path(self._wr_num), 'ab')
+        self._sizes.setdefault(self._wr_num, 0)
+
+    def _drop_oldest(self):
+        num = min(self._sizes)
+        size = self._sizes[num]
+        if num == self._rd_num:
+            size -= self._rd_pos
+        if num == self._wr_num and self._wr is not None:
+            self._wr.close()
+            self._wr = None
+            self._wr_num += 1
+        self.dropped_segments += 1
+        self.dropped_bytes += size
+        self._remove(num)
+        if num == self._rd_num:
+            self._rd_num, self._rd_pos = self._first(), 0
+            self._save_pos()
+
+    def _remove(self, num):
+        if self._rd is not None and self._rd.name == self._seg_path(num):
+            self._rd.close()
+            self._rd = None
+        del self._sizes[num]
+        os.unlink(self._seg_path(num))
+
+    def _reset(self):
+        """Remove the (fully read) last segment, and start a new one on
+        the next append.
+        """
+        self._wr.close()
+        self._wr = None
+        self._remove(self._wr_num)
+        self._wr_num += 1
+        self._rd_num, self._rd_pos = self._wr_num, 0
+        self._save_pos()
+
+    def _load_pos(self):
+        try:
+            with open(self._pos_path) as f:
+                num, pos = f.read().split()
+            return int(num), int(pos)
+        except (IOError, OSError, ValueError):
+            return 0, 0
+
+    def _save_pos(self):
+        tmp = self._pos_path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write('{:d} {:d}\n'.format(self._rd_num, self._rd_pos))
+        os.replace(tmp, self._pos_path)
+        self._unsynced = 0
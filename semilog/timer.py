@@ -1,45 +1,87 @@
 """
-Generate timings with a decorator.
+Generate timings with a decorator, or for nested spans of code.
 
 See `examples/timings.py` for an example
 
 Decorator code adapted from: https://github.com/mgedmin/profilehooks
 """
+import functools
+import itertools
+import math
+import random
+import threading
 import time
+import weakref
 
 default_log = None
 
-def time_fn(fn=None, log=None, timer=None):
+#: Default clock for durations
+default_timer = getattr(time, 'perf_counter', time.time)
+
+#: Default fraction of (top-level) spans that are logged
+default_sample = 1.0
+
+def time_fn(fn=None, log=None, timer=None, aggregate=False, interval=None,
+            percentiles=(50, 99)):
     """Wrap `fn` and log its execution time.
 
+    By default, an event is logged for every call. With `aggregate`,
+    durations are instead added to a histogram, and a summary event
+    is logged every `interval` seconds, and when the wrapped function's
+    `timings.emit()` method is called.
+
     Args:
         fn (function): Function to wrap
         log (function): Log method, with interface of Subject.info()
-        timer (function): If present, called in place of `time.time` to get the
-                          current time in seconds.
+        timer (function): If present, called in place of `default_timer`
+                          to get the current time in seconds.
+        aggregate (bool): If true, log summaries instead of every call
+        interval (float): Seconds between summaries, if aggregating
+        percentiles (list): Percentiles in summaries, if aggregating
     """
     # Mode: Create decorator
     if fn is None:
         def decorator(fn):
-            return time_fn(fn, log=log, timer=timer)
+            return time_fn(fn, log=log, timer=timer, aggregate=aggregate,
+                           interval=interval, percentiles=percentiles)
         return decorator
 
     # Mode: Be decorator
     if timer is None:
-        timer = time.time
-    fp = FuncTimer(fn, timer=timer, log=log)
-    # Return a plain function. Cannot return fp or fp.__call__ directly
-    # as that would break method definitions.
-    def new_fn(*args, **kw):
-        return fp(*args, **kw)
+        timer = default_timer
+    if aggregate:
+        timings = Timings(fn, log=log, interval=interval,
+                          percentiles=percentiles)
+        add = timings.add
+        def new_fn(*args, **kw):
+            start = timer()
+            try:
+                return fn(*args, **kw)
+            finally:
+                add(timer() - start)
+    else:
+        fp = FuncTimer(fn, timer=timer, log=log)
+        # Return a plain function. Cannot return fp or fp.__call__ directly
+        # as that would break method definitions.
+        def new_fn(*args, **kw):
+            return fp(*args, **kw)
     new_fn.__doc__ = fn.__doc__
     new_fn.__name__ = fn.__name__
     new_fn.__dict__ = fn.__dict__
     new_fn.__module__ = fn.__module__
+    if aggregate:
+        new_fn.timings = timings
 
     return new_fn
 
 
+def _fn_info(fn):
+    code = getattr(fn, '__code__', None)
+    return {'funcname': fn.__name__,
+            'filename': getattr(code, 'co_filename', None),
+            'lineno': getattr(code, 'co_firstlineno', None)}
+
+
 class FuncTimer(object):
     """Class that performs the timings.
     """
@@ -49,6 +91,7 @@ class FuncTimer(object):
         self.totaltime = 0
         self.timer = timer
         self.log = log or default_log
+        self._fn_info = _fn_info(fn)
 
     def __call__(self, *args, **kw):
         """Profile a single call to the function."""
@@ -64,12 +107,363 @@ class FuncTimer(object):
             self.log('time_fn', **self._info())
 
     def _info(self):
-        result = {'funcname': self.fn.__name__,
-                  'filename': self.fn.__code__.co_filename,
-                  'lineno': self.fn.__code__.co_firstlineno,
-                  'ncalls': self.ncalls,
-                  'sec': self.duration,
-                  'total_sec': self.totaltime}
+        result = dict(self._fn_info)
+        result.update({'ncalls': self.ncalls,
+                       'sec': self.duration,
+                       'total_sec': self.totaltime})
         result['avg_sec'] = 0. if self.ncalls == 0 else \
             self.totaltime / self.ncalls
         return result
+
+
+class Histogram(object):
+    """Histogram of durations, with logarithmic buckets.
+
+    Each power of two is split into `SUB_BUCKETS` linear buckets, so any
+    value is within about 1.5% of the middle of its bucket.
+    Durations below 1ns are counted as 1ns.
+    """
+
+    SUB_BUCKETS = 32
+
+    def __init__(self):
+        self.n, self.total, self.max = 0, 0., 0.
+        self.counts = {}  # {bucket: count}
+
+    def add(self, sec):
+        if sec < 1e-9:
+            sec = 1e-9
+        m, e = math.frexp(sec)  # sec = m * 2**e, 0.5 <= m < 1
+        b = e * 32 + int((m - 0.5) * 64)  # literals for SUB_BUCKETS
+        counts = self.counts
+        counts[b] = counts.get(b, 0) + 1
+        self.n += 1
+        self.total += sec
+        if sec > self.max:
+            self.max = sec
+
+    @classmethod
+    def bucket(cls, value):
+        """Bucket of a positive value."""
+        m, e = math.frexp(value)
+        return e * cls.SUB_BUCKETS + int((m - 0.5) * 2 * cls.SUB_BUCKETS)
+
+    @classmethod
+    def value(cls, bucket):
+        """Middle value of a bucket."""
+        e, s = divmod(bucket, cls.SUB_BUCKETS)
+        return math.ldexp(0.5 + (s + 0.5) / (2. * cls.SUB_BUCKETS), e)
+
+    @classmethod
+    def edge(cls, bucket):
+        """Lower edge of a bucket."""
+        e, s = divmod(bucket, cls.SUB_BUCKETS)
+        return math.ldexp(0.5 + s / (2. * cls.SUB_BUCKETS), e)
+
+    @classmethod
+    def percentiles(cls, counts, pcts):
+        """Percentiles of a histogram's counts.
+
+        Args:
+            counts (dict): Counts by bucket
+            pcts (list): Percentiles, 0 to 100
+        Returns:
+            (list) Value at each percentile
+        """
+        buckets = sorted(counts)
+        n = sum(counts.values())
+        result = []
+        for p in pcts:
+            rank, seen = max(int(math.ceil(p / 100. * n)), 1), 0
+            for b in buckets:
+                seen += counts[b]
+                if seen >= rank:
+                    result.append(cls.value(b))
+                    break
+            else:
+                result.append(None)
+        return result
+
+
+class Timings(object):
+    """Aggregate durations of calls to a function, and log summaries.
+
+    Each thread adds to its own `Histogram`, without locking.
+    A summary covers the calls since the last one, and is computed from
+    the difference of each histogram with its state at the last summary.
+    """
+
+    def __init__(self, fn, log=None, interval=None, percentiles=(50, 99)):
+        """Create new, empty, timings.
+
+        Args:
+            fn (function): Timed function, for its name and location
+            log (function): Log method, with interface of Subject.info()
+            interval (float): If given, log summary every this many seconds
+            percentiles (list): Percentiles to include in summaries
+        """
+        self.log = log or default_log
+        self.percentiles = percentiles
+        self._fn_info = _fn_info(fn)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._hists = []  # [(thread, histogram, last snapshot)]
+        self._t0 = time.time()
+        self._closed = threading.Event()
+        if interval:
+            thr = threading.Thread(target=self._emit_periodically,
+                                   args=(interval, weakref.ref(self)),
+                                   daemon=True)
+            thr.start()
+
+    def add(self, sec):
+        """Add one duration, in seconds."""
+        try:
+            hist = self._local.hist
+        except AttributeError:
+            hist = self._local.hist = Histogram()
+            with self._lock:
+                self._hists.append([threading.current_thread(), hist,
+                                    (0, 0., {})])
+        hist.add(sec)
+
+    def summary(self):
+        """Summarize calls since the last summary.
+
+        Returns:
+            (dict) Keys `count` and, if there were calls, `mean`, `max`,
+            and `p<N>` for each percentile, all in seconds
+        """
+        counts, total, high = {}, 0., 0.
+        with self._lock:
+            keep = []
+            for item in self._hists:
+                thread, hist, (n0, total0, counts0) = item
+                # copy counts first: other values may be (slightly) newer
+                cur_counts = dict(hist.counts)
+                cur_n, cur_total, cur_max = hist.n, hist.total, hist.max
+                item[2] = (cur_n, cur_total, cur_counts)
+                top = None
+                for b, c in cur_counts.items():
+                    c -= counts0.get(b, 0)
+                    if c > 0:
+                        counts[b] = counts.get(b, 0) + c
+                        if top is None or b > top:
+                            top = b
+                total += cur_total - total0
+                if top is not None:
+                    # top of bucket, unless the all-time max is in it
+                    high = max(high, min(Histogram.edge(top + 1), cur_max))
+                if thread.is_alive() or cur_n != n0:
+                    keep.append(item)
+            self._hists = keep
+        result = {'count': sum(counts.values())}
+        if result['count']:
+            result['mean'] = total / result['count']
+            result['max'] = high
+            for p, v in zip(self.percentiles,
+                            Histogram.percentiles(counts, self.percentiles)):
+                result['p{:g}'.format(p)] = v
+        return result
+
+    def emit(self):
+        """Log a summary of calls since the last summary, if there were any.
+
+        Returns:
+            (dict) The summary
+        """
+        t1 = time.time()
+        result = self.summary()
+        if result['count']:
+            info = dict(self._fn_info)
+            info.update(result)
+            info['interval_sec'] = t1 - self._t0
+            self.log('time_fn.summary', **info)
+        self._t0 = t1
+        return result
+
+    def close(self):
+        """Stop periodic summaries, and log a last one."""
+        self._closed.set()
+        self.emit()
+
+    @staticmethod
+    def _emit_periodically(sec, ref):
+        # hold only a weak reference, so timings can be garbage-collected
+        while True:
+            self = ref()
+            if self is None:
+                break
+            closed = self._closed
+            del self
+            if closed.wait(sec):
+                break
+            self = ref()
+            if self is None:
+                break
+            self.emit()
+            del self
+
+
+# Current span, per asyncio task and thread. Before 3.7 there is no
+# `contextvars`, so spans are kept per thread, and per running task.
+try:
+    import contextvars
+    _current = contextvars.ContextVar('semilog_span', default=None)
+
+    def _get_span():
+        return _current.get()
+
+    def _set_span(value):
+        """Set current span, returning token for `_reset_span()`."""
+        return _current.set(value)
+
+    def _reset_span(token):
+        _current.reset(token)
+except ImportError:
+    try:
+        from asyncio import Task, _get_running_loop
+    except ImportError:  # no asyncio
+        Task = _get_running_loop = None
+    _local = threading.local()
+    _task_spans = weakref.WeakKeyDictionary()
+
+    def _spans():
+        """Mapping and key for the current task, or thread."""
+        loop = _get_running_loop and _get_running_loop()
+        if loop is not None:
+            task = Task.current_task(loop)
+            if task is not None:
+                return _task_spans, task
+        return _local.__dict__, 'span'
+
+    def _get_span():
+        spans, key = _spans()
+        return spans.get(key, None)
+
+    def _set_span(value):
+        spans, key = _spans()
+        token = (spans, key, spans.get(key, None))
+        spans[key] = value
+        return token
+
+    def _reset_span(token):
+        spans, key, value = token
+        if value is None:
+            spans.pop(key, None)
+        else:
+            spans[key] = value
+
+_UNSAMPLED = object()  # current span (and its children) are not logged
+_span_ids = itertools.count(1)
+
+
+def span(name, log=None, sample=None, **kv):
+    """Time a block of code, or calls to a function.
+
+    As a context manager, or decorator, this logs one event per span of
+    code with its `dur` (seconds), `span_id`, and the `parent_id` of the
+    enclosing span, if any, plus the keywords `kv`. For example:
+
+        with span('request', path=path) as sp:
+            with span('query'):
+                rows = db.query()
+            sp['rows'] = len(rows)
+
+    The span returned by `with` is a dict of values to add to its event.
+    If the block raises an exception, its type is in the event's `error`.
+    Each `with` statement needs its own `span()`; decorated functions
+    can be called from any number of threads and tasks at once.
+    Under asyncio, spans nest per task. On Python 3.7+ (`contextvars`),
+    a new task starts inside the span that created it; before that,
+    a new task starts outside any span. Decorated coroutine functions are timed
+    only until they return a coroutine, so use `with` inside them instead.
+
+    Sampling is decided for each top-level span, and its nested spans
+    follow, so they are logged together or not at all. Spans that are
+    not logged cost almost nothing.
+
+    Args:
+        name (str): Event name
+        log (function): Log method, with interface of Subject.info().
+                        Default is `default_log`, when the span ends.
+        sample (float): Fraction of top-level spans to log, default is
+                        `default_sample`
+        kv (dict): Other values for event
+    Returns:
+        (SpanTimer) Context manager and decorator
+    """
+    return SpanTimer(name, log, sample, kv)
+
+
+class Span(dict):
+    """One running span, with values to add to its event.
+    Spans that are not logged have None for `id`.
+    """
+    __slots__ = ('id', 'parent_id', 'start', 'token')
+
+
+class SpanTimer(object):
+    """Context manager and decorator for spans, see `span()`.
+    """
+
+    def __init__(self, name, log, sample, kv):
+        self.name, self.log, self.sample, self.kv = name, log, sample, kv
+
+    def __enter__(self):
+        self._span = self._enter()
+        return self._span
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._exit(self._span, exc_type)
+        return False
+
+    def __call__(self, fn):
+        enter, exit_ = self._enter, self._exit
+        @functools.wraps(fn)
+        def new_fn(*args, **kw):
+            sp = enter()
+            try:
+                result = fn(*args, **kw)
+            except BaseException as err:
+                exit_(sp, type(err))
+                raise
+            exit_(sp, None)
+            return result
+        return new_fn
+
+    def _enter(self):
+        parent = _get_span()
+        if parent is _UNSAMPLED:
+            return _NO_SPAN
+        sp = Span()
+        sp.id = None
+        if parent is None:
+            rate = default_sample if self.sample is None else self.sample
+            if rate < 1 and random.random() >= rate:
+                sp.token = _set_span(_UNSAMPLED)
+                return sp
+        if self.kv:
+            sp.update(self.kv)
+        sp.id = next(_span_ids)
+        sp.parent_id = None if parent is None else parent.id
+        sp.token = _set_span(sp)
+        sp.start = default_timer()
+        return sp
+
+    def _exit(self, sp, exc_type):
+        if sp.id is None:
+            if sp is not _NO_SPAN:
+                _reset_span(sp.token)
+            return
+        dur = default_timer() - sp.start
+        _reset_span(sp.token)
+        if exc_type is not None:
+            sp['error'] = exc_type.__name__
+        log = self.log or default_log
+        log(self.name, dur=dur, span_id=sp.id, parent_id=sp.parent_id, **sp)
+
+
+#: Span for children of spans that are not logged; its values are ignored
+_NO_SPAN = Span()
+_NO_SPAN.id = None
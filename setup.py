@@ -55,6 +55,9 @@ setup(
     packages=packages,
     package_data=package_data,
     install_requires=requires,
+    entry_points={
+        'console_scripts': ['semilog-read = semilog.read:main'],
+    },
     author=semilog.__author__.split()[0],
     author_email=semilog.__author__.split()[1],
     url='https://github.com/dangunter/semilog',
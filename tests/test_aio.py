@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for aio module
+"""
+import asyncio
+import threading
+
+import pytest
+
+from semilog import Subject
+from semilog.aio import AsyncServer, AsyncRemote
+
+localhost = '127.0.0.1'
+
+@pytest.fixture
+def loop(request):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    request.addfinalizer(loop.close)
+    return loop
+
+@pytest.mark.parametrize('compress', [None, 'zlib'])
+def test_send_receive(loop, compress):
+    got = []
+    async def got_event(e):
+        await asyncio.sleep(0)
+        got.append(e)
+    async def main():
+        remote = AsyncRemote(localhost, port=9004, compress=compress)
+        async with AsyncServer(got_event, localhost, port=9004), remote:
+            log = Subject({'observers': [remote]})
+            for i in range(10):
+                log.info('hello', i=i)
+            thr = threading.Thread(target=log.info, args=('thread',))
+            thr.start()
+            thr.join()
+            for _ in range(50):
+                if len(got) == 11:
+                    break
+                await asyncio.sleep(0.1)
+        assert remote.dropped == 0
+    loop.run_until_complete(main())
+    assert [e['i'] for e in got[:10]] == list(range(10))
+    assert got[10]['event'] == 'thread'
+
+def test_not_started():
+    remote = AsyncRemote(localhost, port=9005)
+    log = Subject({'observers': [remote]})
+    log.info('hello')
+    assert remote.dropped == 1
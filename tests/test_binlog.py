@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for binlog module
+"""
+import pytest
+
+from semilog import binlog, send
+
+def log_events(obs, n, t0=1000.0):
+    # pass mappings directly, to control the timestamps
+    for i in range(n):
+        obs.event({'i': i, 'msg': 'hello', 'ts': t0 + i,
+                   'event': 'ev{:d}'.format(i % 3),
+                   'severity': 'W' if i % 2 else 'I'})
+
+def test_binlog(tmpdir):
+    path = str(tmpdir.join('app.slog'))
+    obs = binlog.BinaryLog(path, codec='json', index_every=10)
+    log_events(obs, 100)
+    obs.close()
+    events = list(binlog.read(path))
+    assert len(events) == 100
+    e = events[5]
+    assert e == {'ts': 1005.0, 'event': 'ev2', 'severity': 'W', 'i': 5,
+                 'msg': 'hello'}
+    # seek by time
+    events = list(binlog.read(path, start=1042.5, end=1050))
+    assert [e['i'] for e in events] == list(range(43, 50))
+    # raw records
+    ts, level, name, body = next(binlog.read(path, start=1099, raw=True))
+    assert (ts, level, name) == (1099.0, 2, 'ev0')
+    assert isinstance(body, memoryview)
+
+def test_binlog_segments(tmpdir):
+    path = str(tmpdir.join('app.slog'))
+    obs = binlog.BinaryLog(path, segment_bytes=1024, codec='json')
+    log_events(obs, 100)
+    obs.flush()
+    # readable before close, up to the zero-filled end of the segment
+    assert len(list(binlog.read(path))) == 100
+    obs.close()
+    assert len(binlog.segments(path)) > 3
+    assert [e['i'] for e in binlog.read(path, start=1090)] == \
+        list(range(90, 100))
+    # a new log continues the numbering
+    obs = binlog.BinaryLog(path, codec='json')
+    log_events(obs, 10, t0=2000.0)
+    obs.close()
+    events = list(binlog.read(path))
+    assert len(events) == 110
+    assert events[-1]['ts'] == 2009.0
+
+def test_binlog_bad_codec(tmpdir):
+    with pytest.raises(ValueError):
+        binlog.BinaryLog(str(tmpdir.join('x')), codec='xml')
+
+def test_binlog_subject(tmpdir):
+    path = str(tmpdir.join('app.slog'))
+    obs = binlog.BinaryLog(path)
+    s = send.Subject({'observers': [obs]})
+    s.info('hello', msg='world', v=[1, 2])
+    obs.close()
+    e, = binlog.read(path)
+    assert (e['event'], e['severity'], e['msg'], e['v']) == \
+        ('hello', 'I', 'world', [1, 2])
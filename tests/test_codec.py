@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for codec module
+"""
+import pytest
+
+from semilog import codec, serialize
+
+def events(n):
+    return [{'event': ('req.get', 'req.put')[i % 2], 'severity': 'I',
+             'ts': 1425300000 + i, 'i': i, 'msg': 'ok'} for i in range(n)]
+
+def records(n):
+    dumps = serialize.get_json().dumps
+    return [dumps(e) for e in events(n)]
+
+@pytest.mark.parametrize('name', ['zlib', 'lz4', 'zstd'])
+def test_codec(name):
+    if name not in codec.available():
+        pytest.skip('{} is not installed'.format(name))
+    recs = records(100)
+    frame = codec.Compressor(name).pack(recs)
+    assert frame[:2] == codec.MAGIC
+    assert len(frame) < sum([len(r) for r in recs]) / 2
+    # compressed and plain frames can be mixed
+    frames = [b'{"a": 1}', frame, b'{"b": 2}']
+    assert codec.Decompressor().unpack(frames) == \
+        [b'{"a": 1}'] + recs + [b'{"b": 2}']
+    assert codec.Decompressor().unpack(frames[:1]) == frames[:1]
+
+def test_dictionary():
+    d = codec.train_dictionary(events(500), size=1024)
+    assert 0 < len(d) <= 1024 and b'"severity"' in d
+    rec = records(501)[-1]
+    plain = codec.Compressor('zlib').pack([rec])
+    frame = codec.Compressor('zlib', dictionary=d).pack([rec])
+    assert len(frame) < len(plain)
+    assert codec.Decompressor([d]).unpack([frame]) == [rec]
+    with pytest.raises(ValueError):
+        codec.Decompressor().unpack([frame])
+    with pytest.raises(ValueError):
+        codec.Compressor('snappy')
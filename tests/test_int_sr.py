@@ -35,6 +35,140 @@ def test_sr(client, server):
     assert e['n'] == 1
     assert e[Keys.event] == 'hello'
 
+def test_sr_batch(server):
+    remote = Remote(localhost, batch_events=3)
+    client = Subject({'observers': [remote]})
+    for i in range(4):
+        client.event('i', 'hello', n=i)
+    time.sleep(0.5)
+    assert [e['n'] for e in events] == [0, 1, 2]
+    remote.flush()
+    time.sleep(0.5)
+    assert [e['n'] for e in events] == [0, 1, 2, 3]
+    remote.close()
+
+def test_sr_threads(server):
+    remote = Remote(localhost)
+    client = Subject({'observers': [remote]})
+    sockets = []
+    def send_some():
+        for i in range(100):
+            client.event('i', 'hello', n=i)
+        sockets.append(remote.socket)
+    threads = [threading.Thread(target=send_some) for i in range(4)]
+    for thr in threads:
+        thr.start()
+    for thr in threads:
+        thr.join()
+    time.sleep(1)
+    assert len(events) == 400
+    # sockets of the threads were closed when they exited
+    assert list(remote._sockets) == [threading.current_thread()]
+    assert len(sockets) == 4 and all([sock.closed for sock in sockets])
+    other = Remote(localhost)
+    assert other.socket.context is remote.socket.context
+    other.close()
+    remote.close()
+
+@pytest.mark.parametrize('ordered', [False, True])
+def test_sr_workers(ordered):
+    got = []
+    srv = Server(got.append, localhost, port=9002, workers=3, ordered=ordered)
+    srv.start()
+    client = Subject({'observers': [Remote(localhost, port=9002)]})
+    for i in range(100):
+        client.event('i', 'hello', n=i)
+    time.sleep(1)
+    srv.stop()
+    assert len(got) == 100
+    stats = srv.stats()
+    assert len(stats) == 3
+    assert sum([st['records'] for st in stats]) == 100
+    if ordered:
+        assert [e['n'] for e in got] == list(range(100))
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_sr_batch_cb(columnar):
+    batches = []
+    srv = Server(None, localhost, port=9006, batch_cb=batches.append,
+                 batch_size=40, batch_wait=0.2, columnar=columnar)
+    client = Subject({'observers': [Remote(localhost, port=9006)]})
+    for i in range(100):
+        client.event('i', 'hello', n=i)
+    client.event('i', 'bye')
+    time.sleep(0.2)
+    srv.start()
+    time.sleep(1)
+    srv.stop()
+    if columnar:
+        assert len(batches[0]['n']) == 40
+        n = sum([b['n'] for b in batches], [])
+        assert n == list(range(100)) + [None]
+    else:
+        assert [len(b) for b in batches] == [40, 40, 21]
+
+@pytest.mark.parametrize('url', ['inproc://test-sr', 'ipc://{tmpdir}/sr.sock'])
+def test_sr_endpoint(url, tmpdir):
+    url = url.format(tmpdir=tmpdir)
+    got = []
+    srv = Server(got.append, url, workers=2, ordered=True)
+    srv.start()
+    remote = Remote(url)
+    assert remote.url == url
+    client = Subject({'observers': [remote]})
+    for i in range(50):
+        client.event('i', 'hello', n=i)
+    time.sleep(1)
+    srv.stop()
+    remote.close()
+    assert [e['n'] for e in got] == list(range(50))
+
+def test_sr_store(tmpdir):
+    path = str(tmpdir.join('fwd'))
+    # collector is down: events are stored, and kept after close
+    remote = Remote(localhost, port=9012, store_path=path, hwm=10)
+    client = Subject({'observers': [remote]})
+    for i in range(100):
+        client.event('i', 'hello', n=i)
+    assert remote.stats()['stored'] == 100
+    remote.close()
+    remote = Remote(localhost, port=9012, store_path=path, batch_events=7)
+    client = Subject({'observers': [remote]})
+    for i in range(100, 150):
+        client.event('i', 'hello', n=i)
+    # collector is up: stored events are sent first
+    got = []
+    srv = Server(got.append, localhost, port=9012)
+    srv.start()
+    time.sleep(1)
+    for i in range(150, 160):
+        client.event('i', 'hello', n=i)
+    remote.flush()
+    time.sleep(0.5)
+    srv.stop()
+    remote.close()
+    assert [e['n'] for e in got] == list(range(160))
+    assert remote.stats()['queued_bytes'] == 0
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_sr_compress(workers):
+    from semilog import codec
+    d = codec.train_dictionary([{'event': 'hello', 'n': i} for i in range(50)])
+    got = []
+    srv = Server(got.append, localhost, port=9013, workers=workers,
+                 ordered=True, dictionaries=[d])
+    srv.start()
+    remotes = [Remote(localhost, port=9013, compress='zlib', dictionary=d),
+               Remote(localhost, port=9013, compress='zlib', batch_events=10),
+               Remote(localhost, port=9013)]
+    for remote in remotes:
+        client = Subject({'observers': [remote]})
+        for i in range(20):
+            client.event('i', 'hello', n=i)
+        remote.close()
+    time.sleep(1)
+    srv.stop()
+    assert sorted([e['n'] for e in got]) == sorted(list(range(20)) * 3)
+
 def got_event(e):
     events.append(e)
-
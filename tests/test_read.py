@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for read module
+"""
+import gzip
+import json
+
+import pytest
+
+from semilog import read, send
+
+FMT = "{level} {isotime} {event}: {kvp}"
+
+def write_log(path, n=100, fmt=None, json_format=True):
+    stream = open(path, 'wb')
+    if json_format:
+        obs = send.Stream(fmt=fmt, stream=stream, severity='D')
+    else:
+        class PickleStream(send.Stream):
+            json_format = False
+        obs = PickleStream(stream=stream, severity='D')
+    s = send.Subject({'observers': [obs]})
+    for i in range(n):
+        sugar = (s.info, s.warning, s.debug)[i % 3]
+        sugar('req.{}'.format(('get', 'put')[i % 2]), i=i, dur=i / 10.,
+              msg='took "a" while' if i % 10 == 0 else 'ok')
+    obs.close()
+    stream.close()
+
+def test_read_bad_lines(tmpdir):
+    path = str(tmpdir.join('log'))
+    write_log(path, n=3)
+    with open(path, 'ab') as f:
+        f.write(b'{"not": json\n\xff\xfe\n')
+    write_log(str(tmpdir.join('log2')), n=3)
+    with open(path, 'ab') as f:
+        f.write(open(str(tmpdir.join('log2')), 'rb').read())
+    assert [e['i'] for e in read.read(path)] == [0, 1, 2, 0, 1, 2]
+
+@pytest.mark.parametrize('fmt,json_format', [
+    (None, True), (FMT, True), (None, False)])
+def test_read(tmpdir, fmt, json_format):
+    path = str(tmpdir.join('log'))
+    write_log(path, fmt=fmt, json_format=json_format)
+    events = list(read.read(path, fmt=fmt))
+    assert len(events) == 100
+    e = events[10]
+    assert (e['event'], e['severity'], e['i'], e['dur'], e['msg']) == \
+        ('req.get', 'W', 10, 1.0, 'took "a" while')
+    assert isinstance(e['ts'], float)
+
+def test_text_parser():
+    t0 = 1425300000.25
+    for utc in (False, True):
+        f = send.TextFormatter("[{level}] {isotime} {event} n={n:03d} {kvp}",
+                               utc=utc)
+        p = read.TextParser(f.format_str, utc=utc)
+        m = {'n': 7, 'msg': 'x y', 'k': 'v', 'event': 'hi',
+             'severity': 'E', 'ts': t0}
+        e = p.parse(f.format_event(m))
+        assert e == m
+    assert p.parse('not a log line') is None
+
+def test_query(tmpdir):
+    path = str(tmpdir.join('log'))
+    write_log(path)
+    events = list(read.read(path))
+    for e in events:
+        e['ts'] = e['i'] + 0.5
+    q = read.Query(event='req.g*', severity='I', start=6, end=50.5,
+                   where=['i!=50', 'msg~^ok'], fields=['i', 'nope'])
+    assert list(q(events)) == [
+        {'i': i} for i in range(6, 50, 2) if i % 3 != 2 and i % 10 != 0]
+    q = read.Query(event=['req.put'], where=[lambda e: e['i'] > 90])
+    assert [e['i'] for e in q(events)] == [91, 93, 95, 97, 99]
+    with pytest.raises(ValueError):
+        read.Query(where=['i'])
+
+def test_summary(tmpdir):
+    path = str(tmpdir.join('log'))
+    write_log(path)
+    summary = read.summarize(path, read.Summary(key='dur'))
+    r = summary.result()
+    assert (r['count'], r['min'], r['max']) == (100, 0.0, 9.9)
+    assert r['p50'] == pytest.approx(4.9, rel=0.02)
+    assert r['p99'] == pytest.approx(9.8, rel=0.02)
+    assert r['mean'] == pytest.approx(4.95)
+    r = read.summarize(path, read.Summary(by='event')).result()
+    assert r == {'req.get': {'count': 50}, 'req.put': {'count': 50}}
+    # memory does not grow with the number of values
+    summary = read.Summary(key='x', percentiles=(1, 50, 100))
+    summary.update([{'x': x / 10.} for x in range(-100000, 100000)])
+    assert len(summary._groups[None][5]) < 1000
+    r = summary.result()
+    assert (r['min'], r['max'], r['p100']) == (-10000., 9999.9, 9999.9)
+    assert r['p1'] == pytest.approx(-9800, rel=0.02)
+    assert r['p50'] == pytest.approx(-0.1, rel=0.02)
+
+def test_parallel(tmpdir):
+    path = str(tmpdir.join('log'))
+    write_log(path, n=1000, fmt=FMT)
+    kw = dict(fmt=FMT, query=read.Query(where=['i>=500']))
+    expected = list(read.read(path, **kw))
+    assert len(expected) == 500
+    assert list(read.read_parallel(path, processes=2, chunk_bytes=2000,
+                                   **kw)) == expected
+    summary = read.summarize(path, read.Summary(key='i'), processes=2,
+                             chunk_bytes=2000, **kw)
+    assert summary.result()['count'] == 500
+    assert summary.result()['max'] == 999
+
+def test_cli(tmpdir, capsys):
+    path = str(tmpdir.join('log'))
+    write_log(path, n=10)
+    gz_path = path + '.gz'
+    with gzip.open(gz_path, 'wb') as f:
+        f.write(open(path, 'rb').read())
+    assert read.main([path, gz_path, '-e', 'req.put', '-k', 'i']) == 0
+    lines = capsys.readouterr()[0].splitlines()
+    assert [json.loads(line) for line in lines] == \
+        [{'i': i} for i in (1, 3, 5, 7, 9)] * 2
+    assert read.main([path, '--stats', 'i', '--by', 'severity']) == 0
+    r = json.loads(capsys.readouterr()[0])
+    assert r['I']['count'] == 4 and r['I']['max'] == 9
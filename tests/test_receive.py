@@ -24,6 +24,10 @@ def test_server(server):
     assert server.is_done() == True
     assert event_count == 0
 
+def test_to_columns():
+    cols = receive.to_columns([{'a': 1}, {'b': 2}, {'a': 3, 'b': 4}])
+    assert cols == {'a': [1, None, 3], 'b': [None, 2, 4]}
+
 def got_event(e):
     global event_count
     event_count += 1
@@ -2,12 +2,18 @@
 """
 Tests for send module
 """
-from io import StringIO
+from datetime import datetime
+import gc
+import gzip
+from io import BytesIO, StringIO
+import sys
+import threading
 import time
+import weakref
 
 import pytest
 
-from semilog import send
+from semilog import const, send, serialize
 
 def test_subject():
     s = send.Subject()
@@ -53,6 +59,198 @@ def test_drain():
     dt = time.time() - t0
     assert dt >= (n * sec)
 
+def test_async_overflow():
+    n = 10
+    for policy, dropped, spilled in (('drop-newest', n - 2, 0),
+                                     ('drop-oldest', n - 2, 0),
+                                     ('spill', 0, n - 2)):
+        obs = Many()
+        log = send.Subject({'observers': [Pokey(0.2), obs]}, async=True,
+                           overflow=policy, max_stored=2)
+        for i in range(n):
+            log.event('i', 'zoom-zoom', i=i)
+        st = log.qstats()
+        assert st['dropped'] >= dropped
+        assert st['spilled'] >= spilled
+        assert log.drain()
+        assert log.qlen() == 0
+        if policy == 'spill':
+            assert [e['i'] for e in obs.events_seen] == list(range(n))
+
+def test_async_block():
+    log = send.Subject({'observers': [Pokey(0.1)]}, async=True,
+                       overflow='block', max_stored=1)
+    t0 = time.time()
+    for i in range(4):
+        log.event('i', 'zoom-zoom')
+    assert time.time() - t0 >= 0.1
+    assert log.qstats()['dropped'] == 0
+    assert log.drain()
+
+def test_async_errors():
+    class Broken(send.Observer):
+        def event(self, event):
+            raise ValueError('broken')
+    obs = Many()
+    log = send.Subject({'observers': [Broken(), obs]}, async=True,
+                       overflow='block', max_stored=1)
+    for i in range(10):
+        log.event('i', 'zoom-zoom', i=i)
+    assert log.drain(5)
+    assert [e['i'] for e in obs.events_seen] == list(range(10))
+    # not picklable
+    log = send.Subject({'observers': [Pokey(0.2)]}, async=True,
+                       overflow='spill', max_stored=1)
+    for i in range(3):
+        log.event('i', 'zoom-zoom', f=lambda: i)
+    assert log.qstats()['dropped'] >= 1
+    assert log.drain()
+
+def test_async_bad_overflow():
+    with pytest.raises(ValueError):
+        send.Subject({}, async=True, overflow='explode')
+
+def test_severity_index():
+    obs = Many()  # default severity is 'I'
+    s = send.Subject({'observers': {'many': obs}})
+    s.debug('hidden')
+    s.info('shown')
+    assert [e['event'] for e in obs.events_seen] == ['shown']
+    obs.accept_severity = const.Severity['D']
+    s.debug('still hidden')
+    s.reindex()
+    s.debug('shown')
+    assert len(obs.events_seen) == 2
+    last = Last()
+    s.observers['last'] = last  # overrides accept()
+    s.trace('traced')
+    assert last.last_event['event'] == 'traced'
+    del s.observers['last']
+    s.observers = {'many': obs}
+    s.info('done')
+    assert len(obs.events_seen) == 3
+
+def test_shared_event():
+    a, b, c = Many(), Many(), Mucky()
+    s = send.Subject({'observers': [a, b, c,
+                                    send.Stream(fmt=send.Subject.default_fmt,
+                                                stream=StringIO())]})
+    s.info('hello', x=1)
+    assert a.events_seen[0] is b.events_seen[0]
+    assert 'mucked' not in a.events_seen[0]
+    assert c.last_event['mucked'] == True
+    assert set(a.events_seen[0].keys()) == {'event', 'severity', 'ts', 'x'}
+
+def test_buffered_stream():
+    buf = StringIO()
+    obs = send.Stream(fmt="{event}", stream=buf, flush_events=3,
+                      flush_severity='E', severity='T')
+    s = send.Subject({'observers': [obs]})
+    s.info('a')
+    s.debug('b')
+    assert buf.getvalue() == ''
+    s.info('c')
+    assert buf.getvalue() == 'a\nb\nc\n'
+    s.info('d')
+    s.error('e')
+    assert buf.getvalue().endswith('d\ne\n')
+    s.info('f')
+    obs.flush()
+    assert buf.getvalue().endswith('f\n')
+    s.info('g')
+    obs.close()
+    assert buf.getvalue().endswith('g\n')
+    assert not buf.closed  # caller's stream
+
+def test_buffered_stream_gc():
+    obs = send.Stream(stream=StringIO(), flush_ms=10)
+    ref = weakref.ref(obs)
+    del obs
+    for i in range(10):
+        gc.collect()
+        if ref() is None:
+            break
+        time.sleep(0.01)
+    assert ref() is None
+
+def test_buffered_stream_timer():
+    buf = StringIO()
+    obs = send.Stream(stream=buf, flush_ms=50, flush_bytes=1000)
+    s = send.Subject({'observers': [obs]})
+    s.info('hello')
+    assert buf.getvalue() == ''
+    time.sleep(0.25)
+    assert '"hello"' in buf.getvalue()
+    obs.close()
+
+def test_serializer_old_ujson(monkeypatch):
+    class OldUjson(object):  # before 2.0, no `default` argument
+        @staticmethod
+        def dumps(obj, escape_forward_slashes=True):
+            return '{}'
+    monkeypatch.setitem(sys.modules, 'ujson', OldUjson)
+    monkeypatch.setattr(serialize, 'BACKENDS', (serialize.UjsonSerializer,
+                                                serialize.JsonSerializer))
+    assert serialize.get_json().name == 'json'
+    with pytest.raises(TypeError):
+        serialize.get_json('ujson')
+
+def test_stream_json():
+    when = datetime(2015, 3, 2, 12, 30)
+    for backend in (None, 'json'):
+        json = serialize.get_json(backend)
+        for buf in (StringIO(), BytesIO()):
+            s = send.Subject({'observers': [send.Stream(stream=buf,
+                                                        serializer=json)]})
+            s.info('hello', when=when, tags={'a'})
+            e = json.loads(buf.getvalue())
+            assert e['when'] == '2015-03-02T12:30:00'
+            assert e['tags'] == ['a']
+    with pytest.raises(ValueError):
+        serialize.get_json('jsawn')
+
+def test_ring_buffer():
+    ring = send.RingBuffer(size=5, severity='T')
+    for i in range(7):
+        ring.event({'ts': float(i), 'severity': 'I' if i % 2 else 'D',
+                    'event': 'e{:d}'.format(i % 3), 'i': i})
+    assert len(ring) == 5
+    events = ring.select()
+    assert [e['i'] for e in events] == [2, 3, 4, 5, 6]
+    assert events[0] == {'i': 2, 'event': 'e2', 'severity': 'D', 'ts': 2.0}
+    assert [e['i'] for e in ring.select(severity='I')] == [3, 5]
+    assert [e['i'] for e in ring.select(name='e0')] == [3, 6]
+    assert [e['i'] for e in ring.select(start=3, end=5)] == [3, 4]
+    ring.clear()
+    assert ring.select() == []
+    # tables of names and keys stay bounded
+    for i in range(100):
+        ring.event({'ts': float(i), 'severity': 'I',
+                    'event': 'e{:d}'.format(i), 'k{:d}'.format(i): i})
+    assert len(ring._names) <= 10 and len(ring._keys) <= 10
+    assert ring.select(name='e97') == [
+        {'k97': 97, 'event': 'e97', 'severity': 'I', 'ts': 97.0}]
+    assert [e['event'] for e in ring.select()] == \
+        ['e{:d}'.format(i) for i in range(95, 100)]
+    ring.clear()
+    assert ring._names == [] and ring._keys == []
+
+def test_rotating_file(tmpdir):
+    path = str(tmpdir.join('test.log'))
+    obs = send.RotatingFile(path, max_bytes=100, compress='gzip', keep=2,
+                            fmt="{event} {i}")
+    s = send.Subject({'observers': [obs]})
+    for i in range(40):
+        s.info('hello', i=i)
+    obs.close()
+    rotated = sorted(tmpdir.listdir(lambda p: p.basename != 'test.log'),
+                     key=lambda p: p.mtime())
+    assert len(rotated) == 2
+    assert all([p.ext == '.gz' for p in rotated])
+    with gzip.open(str(rotated[-1])) as f:
+        lines = f.read().decode('utf-8').splitlines()
+    assert lines[-1] == 'hello {:d}'.format(39 - len(open(path).readlines()))
+
 def test_send_defaults():
     obs = Last(severity='T')
     s = send.Subject({'observers': [obs]})
@@ -60,6 +258,166 @@ def test_send_defaults():
     e = obs.last_event
     assert e['event'] == 'hello'
 
+def test_text_formatter():
+    m = {'ts': 0.5, 'event': 'hello', 'severity': 'W', 'msg': 'a "b" c',
+         'n': 1, 'x': 2.5}
+    f = send.TextFormatter("{level} {event}: [{n:03d}] {x!r} {{n}} {kvp}")
+    assert f.format_event(m.copy()) == \
+           'WARNING hello: [001] 2.5 {n} ts=0.500000 msg="a \\"b\\" c" x=2.5'
+    # falls back to str.format()
+    f = send.TextFormatter("{event} {x.real} {kvp}")
+    assert f._plan is None
+    assert f.format_event(m.copy()) == \
+           'hello 2.5 ts=0.500000 severity=WARNING msg="a \\"b\\" c" n=1 x=2.5'
+
+def test_add_kvp_deprecated():
+    f = send.TextFormatter("{event} {kvp}")
+    m = {'event': 'hi', 'x': 1}
+    with pytest.warns(DeprecationWarning):
+        f.add_kvp(m)
+    assert m['kvp'] == 'x=1'
+    class Old(send.TextFormatter):
+        def add_kvp(self, m):
+            m['kvp'] = 'old'
+    with pytest.warns(DeprecationWarning):
+        f = Old("{event} {kvp}")
+    m = {'event': 'hi', 'x': 1}
+    assert f.format_event(m) == 'hi old' and 'kvp' not in m
+
+def test_format_hook_deprecated():
+    class Old(send.TextFormatter):
+        derived_values = ['level', 'up']
+        def format_level(self, m):
+            m['level'] = m['severity'].lower()
+        def format_up(self, m):
+            m['up'] = m['event'].upper()
+    f = Old("{level} {up} {kvp}")
+    m = {'event': 'hi', 'severity': 'I', 'x': 1}
+    with pytest.warns(DeprecationWarning):
+        assert f.format_event(m) == 'i HI event=hi x=1'
+    assert m == {'event': 'hi', 'severity': 'I', 'x': 1}
+
+def test_isotime():
+    local, utc = send.IsoTime(), send.IsoTime(utc=True)
+    t0 = time.time()
+    for ts in (t0, t0 + 0.25, t0 + 0.5, float(int(t0) + 1), 1.9999996):
+        assert local(ts) == datetime.fromtimestamp(ts).isoformat()
+        assert utc(ts) == datetime.utcfromtimestamp(ts).isoformat() + 'Z'
+    f = send.TextFormatter("{isotime}", utc=True)
+    assert f.format_event({'ts': 0.5}) == '1970-01-01T00:00:00.500000Z'
+
+def test_filters():
+    from semilog import filters
+    limit = filters.EveryKth(first=2, every=3)
+    obs = send.RingBuffer(size=100, filters=[limit])
+    s = send.Subject({'observers': [obs]})
+    for i in range(11):
+        s.info('loop', i=i)
+        s.info('other', i=i)
+    s.debug('loop')  # not counted by filter
+    assert [e['i'] for e in obs.select(name='loop')] == [0, 1, 4, 7, 10]
+    assert limit.stats() == {'suppressed': 12,
+                             'suppressed_by': {'loop': 6, 'other': 6}}
+    # by several keys
+    f = filters.EveryKth(first=1, every=100, key=('event', 'msg'))
+    assert [f({'event': 'e', 'msg': m}) for m in 'aabab'] == \
+        [True, False, True, False, False]
+
+def test_rate_limit(monkeypatch):
+    from semilog import filters
+    now = [100.]
+    monkeypatch.setattr(filters, '_clock', lambda: now[0])
+    f = filters.RateLimit(2, burst=3)
+    m = {'event': 'x'}
+    assert [f(m) for i in range(5)] == [True] * 3 + [False] * 2
+    now[0] += 1
+    assert [f(m) for i in range(3)] == [True, True, False]
+    assert f({'event': 'y'})
+    now[0] += 10  # bucket is full again, but no more
+    assert [f(m) for i in range(4)] == [True] * 3 + [False]
+    assert f.suppressed == 4
+
+def test_sample():
+    from semilog import filters
+    f = filters.Sample(rate=0.5, rates={'all': 1, 'none': 0})
+    assert all([f({'event': 'all'}) for i in range(100)])
+    assert not any([f({'event': 'none'}) for i in range(100)])
+    n = sum([f({'event': 'half'}) for i in range(1000)])
+    assert 300 < n < 700
+    assert f.suppressed_by['none'] == 100
+
+def test_lazy():
+    calls = []
+    def expensive():
+        calls.append(1)
+        return 42
+    obs, ring = Mucky(), send.RingBuffer()
+    s = send.Subject({'observers': [obs, ring]})
+    assert s.enabled_for('I') and not s.enabled_for('D')
+    s.debug('skipped', v=send.Lazy(expensive))
+    assert calls == []
+    s.info('done', v=send.Lazy(expensive), f=expensive)
+    assert calls == [1]
+    assert obs.last_event['v'] == 42 and ring.select()[-1]['v'] == 42
+    assert obs.last_event['f'] is expensive
+    # all callables
+    s.lazy_callables = True
+    s.info('done', f=expensive, bad=send.Lazy(lambda: 1 / 0))
+    assert obs.last_event['f'] == 42 and len(calls) == 2
+    assert obs.last_event['bad'].startswith('<error: ')
+
+def test_channel():
+    ring, mucky = send.RingBuffer(size=1000, severity='D'), Mucky()
+    chan = send.Channel([ring, mucky], batch_size=10, severity='D')
+    subjects = [send.Subject({'observers': [chan]}) for i in range(2)]
+    def run(s, j):
+        for i in range(100):
+            s.debug('hello', i=i, j=j)
+    threads = [threading.Thread(target=run, args=(s, j))
+               for j, s in enumerate(subjects * 2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    subjects[0].info('last')
+    assert chan.flush()
+    assert len(ring) == 401
+    for j in range(4):
+        assert [e['i'] for e in ring.select() if e.get('j') == j] == \
+            list(range(100))
+    # mucky only gets info, and copies
+    assert mucky.last_event['event'] == 'last'
+    assert 'mucked' not in ring.select()[-1]
+    chan.close()
+    assert not chan._thread.is_alive()
+
+def test_channel_dropped():
+    go = threading.Event()
+    class Stuck(send.Observer):
+        def events(self, mappings):
+            go.wait()
+    chan = send.Channel([Stuck()], max_queued=10)
+    s = send.Subject({'observers': [chan]})
+    s.info('first')
+    time.sleep(0.1)  # collector is stuck with first event
+    for i in range(20):
+        s.info('hello', i=i)
+    assert chan.dropped == 10
+    go.set()
+    # flush is not held up by a full queue, or events still arriving
+    stop = threading.Event()
+    def spam():
+        while not stop.is_set():
+            s.info('more')
+    thr = threading.Thread(target=spam)
+    thr.start()
+    try:
+        assert chan.flush(timeout=5)
+    finally:
+        stop.set()
+        thr.join()
+    chan.close()
+
 class Pokey(send.Observer):
     def __init__(self, sec):
         send.Observer.__init__(self)
@@ -68,9 +426,23 @@ class Pokey(send.Observer):
     def event(self, event):
         time.sleep(self.sec)
 
+class Many(send.Observer):
+    def __init__(self):
+        send.Observer.__init__(self)
+        self.events_seen = []
+
+    def event(self, event):
+        self.events_seen.append(event)
+
+class Mucky(send.Observer):
+    mutates_event = True
+
+    def event(self, event):
+        event['mucked'] = True
+        self.last_event = event
+
 class Last(send.Observer):
     def accept(self, m):
         return True
     def event(self, event):
         self.last_event = event
-
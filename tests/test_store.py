@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for store module
+"""
+import os
+
+from semilog import store
+
+def drain(st):
+    result = []
+    while True:
+        frames = st.peek()
+        if frames is None:
+            return result
+        result.append(frames)
+        st.pop()
+
+def test_store(tmpdir):
+    path = str(tmpdir.join('st'))
+    st = store.Store(path, segment_bytes=100)
+    msgs = [[str(i).encode(), b'x' * i] for i in range(20)]
+    for m in msgs[:10]:
+        st.append(m)
+    assert drain(st)[:3] == msgs[:3]
+    assert st.empty and store.segments(path) == []
+    for m in msgs[10:]:
+        st.append(m)
+    assert len(store.segments(path)) > 1
+    assert st.peek() == msgs[10]
+    st.pop()
+    st.close()
+    # reopen, with a partial record at the end
+    with open(store.segments(path)[-1], 'ab') as f:
+        f.write(b'\x10\x00')
+    st = store.Store(path)
+    assert drain(st) == msgs[11:]
+    assert st.stats()['read'] == 9 and st.stats()['queued_bytes'] == 0
+    assert store.segments(path) == []
+
+def test_store_quota(tmpdir):
+    path = str(tmpdir.join('st'))
+    st = store.Store(path, segment_bytes=1000, quota_bytes=3000)
+    for i in range(100):
+        st.append(['{:03d}'.format(i).encode(), b'x' * 100])
+    stats = st.stats()
+    assert stats['dropped_segments'] > 0 and stats['segments'] <= 3
+    assert sum([os.path.getsize(p) for p in store.segments(path)]) <= 3000
+    got = [int(m[0]) for m in drain(st)]
+    assert got == list(range(100 - len(got), 100))
+    assert not st.append([b'x' * 3000])
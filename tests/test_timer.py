@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for timer module
+"""
+import threading
+import time
+
+import pytest
+
+from semilog import timer
+
+class Events(object):
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, name, **kw):
+        self.events.append((name, kw))
+
+def test_time_fn():
+    log = Events()
+    @timer.time_fn(log=log)
+    def add(x, y):
+        return x + y
+    assert add(1, 2) == 3
+    assert add(2, 3) == 5
+    name, e = log.events[-1]
+    assert (name, e['funcname'], e['ncalls']) == ('time_fn', 'add', 2)
+    assert e['sec'] >= 0 and e['lineno'] > 0
+
+def test_histogram():
+    h = timer.Histogram()
+    values = [i * 1e-4 for i in range(1, 1001)]
+    for v in values:
+        h.add(v)
+    p50, p99, p100 = timer.Histogram.percentiles(h.counts, (50, 99, 100))
+    assert p50 == pytest.approx(0.05, rel=0.02)
+    assert p99 == pytest.approx(0.099, rel=0.02)
+    assert p100 == pytest.approx(0.1, rel=0.02)
+    assert (h.n, h.max) == (1000, 0.1)
+
+def test_time_fn_aggregate():
+    log = Events()
+    local = threading.local()
+    def fake_timer():  # every call takes 1ms, in each thread
+        local.t = getattr(local, 't', 0) + 0.001
+        return local.t
+    @timer.time_fn(log=log, aggregate=True, timer=fake_timer)
+    def noop(x):
+        return x
+    threads = [threading.Thread(target=lambda: [noop(i) for i in range(100)])
+               for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert log.events == []
+    s = noop.timings.emit()
+    name, e = log.events[-1]
+    assert (name, e['funcname'], e['count']) == ('time_fn.summary', 'noop',
+                                                 400)
+    for k in ('mean', 'max', 'p50', 'p99'):
+        assert e[k] == pytest.approx(0.001, rel=0.02)
+    assert s['count'] == 400
+    # next summary only has the new calls
+    noop(1)
+    assert noop.timings.emit()['count'] == 1
+    assert noop.timings.emit() == {'count': 0}
+    assert len(log.events) == 2
+
+def test_time_fn_interval():
+    log = Events()
+    @timer.time_fn(log=log, aggregate=True, interval=0.05)
+    def noop():
+        pass
+    for i in range(10):
+        noop()
+    time.sleep(0.3)
+    assert [e['count'] for _, e in log.events] == [10]
+    noop.timings.close()
+
+def test_span():
+    log = Events()
+    @timer.span('inner', log=log, k=1)
+    def inner(fail=False):
+        if fail:
+            raise ValueError()
+    with timer.span('outer', log=log) as sp:
+        inner()
+        with pytest.raises(ValueError):
+            inner(fail=True)
+        sp['rows'] = 3
+    (n1, i1), (n2, i2), (n3, o) = log.events
+    assert (n1, n2, n3) == ('inner', 'inner', 'outer')
+    assert i1['parent_id'] == i2['parent_id'] == o['span_id']
+    assert o['parent_id'] is None and o['rows'] == 3
+    assert i1['k'] == 1 and 'error' not in i1
+    assert i2['error'] == 'ValueError'
+    assert o['dur'] >= i1['dur'] + i2['dur']
+    # threads have their own spans
+    thr = threading.Thread(target=inner)
+    with timer.span('outer', log=log):
+        thr.start()
+        thr.join()
+    assert log.events[-2][1]['parent_id'] is None
+
+def test_span_sample():
+    log = Events()
+    for i in range(100):
+        with timer.span('outer', log=log, sample=0):
+            with timer.span('inner', log=log, sample=1):
+                pass
+    assert log.events == []
+    for i in range(1000):
+        with timer.span('outer', log=log, sample=0.5):
+            with timer.span('inner', log=log):
+                pass
+    names = [name for name, _ in log.events]
+    assert 300 < names.count('outer') == names.count('inner') < 700
+    # context is restored
+    with timer.span('last', log=log):
+        pass
+    assert log.events[-1][1]['parent_id'] is None
+
+def test_span_asyncio():
+    import asyncio
+    log = Events()
+    async def task(i):
+        with timer.span('task', log=log, i=i):
+            await asyncio.sleep(0.01)
+            with timer.span('step', log=log, i=i):
+                await asyncio.sleep(0.01)
+    async def main():
+        await asyncio.gather(*[task(i) for i in range(3)])
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(main())
+    loop.close()
+    tasks = dict([(e['i'], e['span_id']) for name, e in log.events
+                  if name == 'task'])
+    steps = [e for name, e in log.events if name == 'step']
+    assert len(steps) == 3
+    assert all([e['parent_id'] == tasks[e['i']] for e in steps])